@@ -1,24 +1,112 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, url_for
+from flask import (Flask, Request, Response, abort, g, request, jsonify, render_template, send_file,
+                   stream_with_context, url_for)
+import io
+import json
 import os
 import uuid 
+from tempfile import SpooledTemporaryFile
 from werkzeug.utils import secure_filename
-from config import UPLOAD_FOLDER, ALLOWED_EXTENSIONS, TRANSCRIPT_FOLDER, logger
-from src.document_processor import process_input_document  
-from src.audio_utils import convert_audio, transcribe_audio_with_whisper
+from config import (UPLOAD_FOLDER, ALLOWED_EXTENSIONS, TRANSCRIPT_FOLDER, LOW_MODEL, HIGH_MODEL, WHISPER_PRELOAD,
+                    AUDIO_SPOOL_THRESHOLD, AUDIO_SAMPLE_RATE, BATCH_API_MAX_ITEMS, STARTUP_WARMUP,
+                    AUDIO_READ_CHUNK_SIZE, LIVE_MAX_CHUNK_BYTES, LIVE_FINISH_TIMEOUT, JOB_STAGE_WORKERS,
+                    logger)
+# The report and audio pipelines (src.document_processor, src.audio_utils, src.batch) are imported
+# inside the routes that use them, so starting a worker does not load LangChain, fpdf2 or PyMuPDF
+from src.model_registry import get_model_registry
+from src.jobs import get_job_manager, QueueFullError
+from src.pdf_store import get_pdf_store
+from src.upload_store import get_upload_store, stream_digest
+from src.metrics import REGISTRY, HTTP_REQUEST_SECONDS, JOB_QUEUE_DEPTH
+from src.tracing import start_trace, finish_trace
+from src.whisper_scheduler import AUTO_OPTION, MODEL_OPTIONS, get_whisper_scheduler
+
+
+class SpoolingRequest(Request):
+    """Keep uploaded files in memory and only spool them to disk above AUDIO_SPOOL_THRESHOLD."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=AUDIO_SPOOL_THRESHOLD, mode='rb+')
+
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(TRANSCRIPT_FOLDER, exist_ok=True)
 
+if WHISPER_PRELOAD:
+    get_model_registry().preload([LOW_MODEL, HIGH_MODEL])
+
+JOB_QUEUE_DEPTH.set_function(lambda: {(stage,): depth for stage, depth in get_job_manager().queue_depths().items()})
+
+# Polled by load balancers and Prometheus; timed, but not logged on every call
+QUIET_ENDPOINTS = {'healthz', 'metrics'}
+
+@app.before_request
+def begin_request_trace():
+    g.trace = start_trace(f"{request.method} {request.path}", request.headers.get('X-Request-ID'))
+
+@app.after_request
+def end_request_trace(response: Response) -> Response:
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    response.headers['X-Request-ID'] = trace.request_id
+    endpoint, method, status = request.endpoint or 'unknown', request.method, str(response.status_code)
+
+    def finish() -> None:
+        # Runs once the body has been sent, so streamed reports are timed until their last byte
+        seconds = finish_trace(trace, quiet=endpoint in QUIET_ENDPOINTS)
+        HTTP_REQUEST_SECONDS.observe(seconds, endpoint=endpoint, method=method, status=status)
+
+    response.call_on_close(finish)
+    return response
+
 def is_allowed_extension(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def wants_async() -> bool:
+    return request.values.get('async', '').lower() in ('1', 'true', 'yes')
+
+def wants_inline() -> bool:
+    return request.values.get('inline', '').lower() in ('1', 'true', 'yes')
+
+def send_report(report_id: str, as_attachment: bool = True):
+    """Send a stored report with a strong ETag; send_file answers If-None-Match with 304 and serves Range requests."""
+    stored = get_pdf_store().get(report_id)
+    if stored is None:
+        abort(404)
+    # Disk-tier reports go out as files, so the WSGI server can use sendfile()
+    source = stored.path if stored.data is None else io.BytesIO(stored.data)
+    return send_file(source, mimetype='application/pdf', as_attachment=as_attachment, download_name=report_id,
+                     etag=stored.etag, last_modified=stored.created, conditional=True)
+
+def enqueue_job(steps, on_finish=None):
+    """Submit a background job and answer 202 with its status URL, or 429 when the stage queue is full."""
+    try:
+        job = get_job_manager().submit(steps, on_finish)
+    except QueueFullError as e:
+        logger.warning("Rejecting request: %s", e)
+        if on_finish:
+            on_finish()
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    status_url = url_for('job_status', job_id=job.id, _external=True)
+    return jsonify({'job_id': job.id, 'status_url': status_url}), 202, {'Location': status_url}
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/submit', methods=['POST'])
-def submit():
+def release_uploads(*paths) -> None:
+    """Drop the references a request took on its stored uploads."""
+    store = get_upload_store()
+    store.release(*(store.digest_of(path) for path in paths if path))
+
+def save_submission_files():
+    """
+    Save the optional document and signature of a /submit request to the upload store.
+    Returns (message, document, signature, error_response); pass the paths to release_uploads() when done.
+    """
     user_text: str = request.form.get('user_text', '')
     logger.info("Received message: %s", user_text)
     response_message = f"Text received: {user_text}. "
@@ -27,14 +115,12 @@ def submit():
     document_filepath = None
     if document_file and document_file.filename:
         try:
-            document_filename = f"{uuid.uuid4().hex}_{secure_filename(document_file.filename)}"
-            document_filepath = os.path.join(app.config['UPLOAD_FOLDER'], document_filename)
-            document_file.save(document_filepath)
-            response_message += f"Document {document_filename} uploaded. "
+            document_filepath = get_upload_store().save(document_file.stream, document_file.filename).path
+            response_message += f"Document {secure_filename(document_file.filename)} uploaded. "
             logger.info("Document saved: %s", document_filepath)
         except Exception as e:
             logger.exception("Error saving document file: %s", e)
-            return jsonify({'error': 'Failed to save document file'}), 500
+            return None, None, None, (jsonify({'error': 'Failed to save document file'}), 500)
     else:
         response_message += "No document uploaded. "
 
@@ -42,85 +128,456 @@ def submit():
     signature_filepath = None
     if signature_file and signature_file.filename:
         try:
-            signature_filename = f"{uuid.uuid4().hex}_{secure_filename(signature_file.filename)}"
-            signature_filepath = os.path.join(app.config['UPLOAD_FOLDER'], signature_filename)
-            signature_file.save(signature_filepath)
-            response_message += f"Signature {signature_filename} uploaded. "
+            signature_filepath = get_upload_store().save(signature_file.stream, signature_file.filename).path
+            response_message += f"Signature {secure_filename(signature_file.filename)} uploaded. "
             logger.info("Signature saved: %s", signature_filepath)
         except Exception as e:
             logger.exception("Error saving signature file: %s", e)
-            return jsonify({'error': 'Failed to save signature file'}), 500
+            release_uploads(document_filepath)
+            return None, None, None, (jsonify({'error': 'Failed to save signature file'}), 500)
     else:
         response_message += "No signature uploaded. "
+    return response_message, document_filepath, signature_filepath, None
+
+@app.route('/submit', methods=['POST'])
+def submit():
+    from src.document_processor import process_input_document, build_report_content, render_report
+    user_text: str = request.form.get('user_text', '')
+    response_message, document_filepath, signature_filepath, error_response = save_submission_files()
+    if error_response:
+        return error_response
+
+    report_id = f"report_{uuid.uuid4().hex}.pdf"
+    download_url = url_for('download_file', filename=report_id, _external=True)
 
+    if wants_async():
+        if not signature_filepath:
+            # Nothing would be queued, so an async request without a signature is an error rather than a 200
+            release_uploads(document_filepath)
+            return jsonify({'error': 'A signature is required to generate a report'}), 400
 
-    output_pdf_filename = f"report_{uuid.uuid4().hex}.pdf"
-    output_pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], output_pdf_filename)
+        def llm_step(_):
+            content = build_report_content(user_text, document_filepath)
+            if content is None:
+                raise RuntimeError('Failed to process input document')
+            return content
+
+        def pdf_step(content):
+            if not render_report(content, report_id, signature_filepath):
+                raise RuntimeError('Failed to render report')
+            return {'message': response_message, 'download_url': download_url}
+
+        return enqueue_job([('llm', llm_step), ('pdf', pdf_step)],
+                           on_finish=lambda: release_uploads(document_filepath, signature_filepath))
 
     if signature_filepath:
-        success = process_input_document(
-            text_input=user_text,
-            output_pdf_path=output_pdf_path,
-            signature_path=signature_filepath
-        )
+        try:
+            success = process_input_document(
+                text_input=user_text,
+                report_id=report_id,
+                signature_path=signature_filepath,
+                input_filepath=document_filepath
+            )
+        finally:
+            release_uploads(document_filepath, signature_filepath)
         if not success:
             return jsonify({'error': 'Failed to process input document'}), 500
+        if wants_inline():
+            return send_report(report_id, as_attachment=False)
+    else:
+        release_uploads(document_filepath)
 
-    download_url = url_for('download_file', filename=output_pdf_filename, _external=True)
     return jsonify({'message': response_message, 'download_url': download_url}), 200
 
-@app.route('/upload', methods=['POST'])
-def upload_audio():
+@app.route('/submit/stream', methods=['POST'])
+def submit_stream():
+    """Stream report sections as newline-delimited JSON, then render the PDF from the accumulated sections."""
+    from src.agent import assemble_streamed_report
+    from src.document_processor import render_report, stream_report_content
+    user_text: str = request.form.get('user_text', '')
+    response_message, document_filepath, signature_filepath, error_response = save_submission_files()
+    if error_response:
+        return error_response
+    if not signature_filepath:
+        # Like /submit, which only renders a report when a signature is attached
+        release_uploads(document_filepath)
+        return jsonify({'error': 'A signature is required to generate a report'}), 400
+
+    report_id = f"report_{uuid.uuid4().hex}.pdf"
+    download_url = url_for('download_file', filename=report_id, _external=True)
+
+    def generate():
+        yield json.dumps({'type': 'message', 'message': response_message}) + '\n'
+        title, sections = "Generated Report", []
+        try:
+            for event in stream_report_content(user_text, document_filepath):
+                if event['type'] == 'title':
+                    title = event['title']
+                else:
+                    sections.append(event)
+                yield json.dumps(event) + '\n'
+            content = assemble_streamed_report(title, sections)
+            if not render_report(content, report_id, signature_filepath):
+                raise RuntimeError('Failed to render report')
+        except Exception as e:
+            logger.exception("Error during streamed report generation: %s", e)
+            yield json.dumps({'type': 'error', 'error': 'Failed to process input document'}) + '\n'
+            return
+        finally:
+            release_uploads(document_filepath, signature_filepath)
+        yield json.dumps({'type': 'done', 'download_url': download_url}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Generate many reports from an uploaded CSV/JSONL `items` file and stream them back as a ZIP.
+
+    Items run on the shared job queues next to other requests. An optional `signature` upload is applied to every item. Paths inside the
+    items file are ignored here, only the CLI reads local files.
+    """
+    from src.batch import load_batch_items, stream_batch_zip
+    items_file = request.files.get('items')
+    if not items_file or not items_file.filename:
+        return jsonify({'error': 'No items file provided'}), 400
+    fmt = 'csv' if items_file.filename.lower().endswith('.csv') else 'jsonl'
+    try:
+        items = load_batch_items(io.TextIOWrapper(items_file.stream, encoding='utf-8', newline=''), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.error("Invalid batch file: %s", e)
+        return jsonify({'error': f'Invalid batch file: {e}'}), 400
+    if len(items) > BATCH_API_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_API_MAX_ITEMS} items per request'}), 413
+    if get_job_manager().is_full('llm'):
+        # Batch items run on the shared job queues, so a busy server rejects new batches up front
+        logger.warning("Rejecting batch: the llm queue is full")
+        return jsonify({'error': 'The llm queue is full'}), 429, {'Retry-After': '5'}
+
+    signature_filepath = None
+    signature_file = request.files.get('signature')
+    if signature_file and signature_file.filename:
+        signature_filepath = get_upload_store().save(signature_file.stream, signature_file.filename).path
+    items = [{'id': item['id'], 'text': item['text'], 'signature': signature_filepath} for item in items]
+    manager = get_job_manager()
+
+    def generate():
+        try:
+            yield from stream_batch_zip(items, job_manager=manager, llm_concurrency=JOB_STAGE_WORKERS['llm'])
+        finally:
+            release_uploads(signature_filepath)
+
+    logger.info("Starting batch of %d reports", len(items))
+    return Response(generate(), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=reports.zip'})
+
+def read_audio_request(decode: bool = True):
+    """
+    Validate an audio upload and decode it to PCM. Returns (pcm, model_option, digest, error_response).
+
+    The upload is hashed first; when its transcript is already cached, decoding is skipped and pcm is None.
+    With option 0 ("auto") only a cached HIGH_MODEL transcript skips decoding; see schedule_transcription().
+    With decode=False the upload is saved to the upload store instead and its path is returned in place
+    of pcm, for decoding in a job; pass it to release_uploads() when done.
+    """
+    from src.audio_utils import decode_audio_to_pcm, get_cached_segments
     if 'audio' not in request.files:
         logger.error("No audio file part in the request")
-        return jsonify({'error': 'No audio file provided'}), 400
+        return None, None, None, (jsonify({'error': 'No audio file provided'}), 400)
 
     audio_file = request.files['audio']
-    audio_filename = f"{uuid.uuid4().hex}_{secure_filename(audio_file.filename)}"
+    audio_filename = secure_filename(audio_file.filename)
     if not audio_filename:
         logger.error("No audio file selected")
-        return jsonify({'error': 'No selected file'}), 400
+        return None, None, None, (jsonify({'error': 'No selected file'}), 400)
 
     try:
         model_option = int(request.form.get('option', 1))
     except ValueError:
         logger.error("Invalid model option provided")
-        return jsonify({'error': 'Invalid model option'}), 400
+        return None, None, None, (jsonify({'error': 'Invalid model option'}), 400)
+
+    if not is_allowed_extension(audio_filename):
+        logger.error("Audio file type not allowed")
+        return None, None, None, (jsonify({'error': 'File type not allowed'}), 400)
+
+    try:
+        digest = stream_digest(audio_file.stream)
+        cached_option = MODEL_OPTIONS[HIGH_MODEL] if model_option == AUTO_OPTION else model_option
+        if get_cached_segments(digest, cached_option) is not None:
+            logger.info("Transcript of %s is cached, skipping decoding", audio_filename)
+            return None, model_option, digest, None
+        if not decode:
+            return get_upload_store().save(audio_file.stream, audio_filename).path, model_option, digest, None
+        pcm = decode_audio_to_pcm(audio_file.stream)
+        logger.info("Decoded %s to %.1fs of 16 kHz mono PCM", audio_filename, len(pcm) / AUDIO_SAMPLE_RATE)
+    except Exception as e:
+        logger.exception("Failed to process audio file: %s", e)
+        return None, None, None, (jsonify({'error': str(e)}), 500)
+    return pcm, model_option, digest, None
+
+def schedule_transcription(pcm, model_option, digest, speculative=None):
+    """
+    Resolve option 0 ("auto") to a Whisper model with the scheduler. Returns (model_option, decision).
+
+    The decision is None when the client picked a model itself. `speculative`
+    overrides WHISPER_SPECULATIVE, e.g. for async jobs where nobody reads the fast transcript.
+    """
+    from src.audio_utils import get_cached_segments
+    if model_option != AUTO_OPTION:
+        return model_option, None
+    cached = [name for name, option in MODEL_OPTIONS.items() if get_cached_segments(digest, option) is not None]
+    duration = len(pcm) / AUDIO_SAMPLE_RATE if pcm is not None else 0.0
+    decision = get_whisper_scheduler().choose(duration, cached, speculative)
+    return decision.option, decision
+
+def start_refinement(pcm, digest, decision):
+    """Queue the HIGH_MODEL pass of a speculative transcription. Returns the job, or None when the queue is full."""
+    from src.audio_utils import iter_transcript_segments
+    scheduler = get_whisper_scheduler()
+    ticket = scheduler.reserve(HIGH_MODEL, decision.duration)
+
+    def refine(_):
+        # From here on the transcription counts itself in the backlog
+        scheduler.release(ticket)
+        segments = list(iter_transcript_segments(pcm, MODEL_OPTIONS[HIGH_MODEL], digest))
+        return {'model': HIGH_MODEL, 'transcript': " ".join(segment['text'] for segment in segments),
+                'segments': segments}
+
+    try:
+        job = get_job_manager().submit([('transcription', refine)], on_finish=lambda: scheduler.release(ticket))
+    except QueueFullError as e:
+        scheduler.release(ticket)
+        logger.warning("Skipping transcript refinement: %s", e)
+        return None
+    return job
+
+def refinement_info(job):
+    return {'job_id': job.id, 'status_url': url_for('job_status', job_id=job.id, _external=True)}
 
-    if audio_file and is_allowed_extension(audio_filename):
-        audio_filepath = os.path.join(app.config['UPLOAD_FOLDER'], audio_filename)
+@app.route('/upload', methods=['POST'])
+def upload_audio():
+    from src.audio_utils import decode_audio_to_pcm, transcribe_audio_with_whisper
+    run_async = wants_async()
+    pcm, model_option, digest, error_response = read_audio_request(decode=not run_async)
+    if error_response:
+        return error_response
+
+    if run_async:
+        # Decoding runs in the job too, so ffmpeg is bounded by the transcription workers
+        audio_filepath = pcm
+
+        def transcription_step(_):
+            audio = None
+            if audio_filepath:
+                with open(audio_filepath, 'rb') as f:
+                    audio = decode_audio_to_pcm(f)
+            option, _ = schedule_transcription(audio, model_option, digest, speculative=False)
+            return {'transcript': transcribe_audio_with_whisper(audio=audio, model=option, digest=digest)}
+
+        return enqueue_job([('transcription', transcription_step)], on_finish=lambda: release_uploads(audio_filepath))
+
+    model_option, decision = schedule_transcription(pcm, model_option, digest)
+    transcript = transcribe_audio_with_whisper(
+        audio=pcm,
+        model=model_option,
+        digest=digest
+    )
+    response = {'transcript': transcript}
+    if decision:
+        response['model'] = decision.to_dict()
+        if decision.refine:
+            # The fast transcript goes back now; the accurate one is polled from the job
+            job = start_refinement(pcm, digest, decision)
+            if job:
+                response['refinement'] = refinement_info(job)
+    return jsonify(response), 200
+
+@app.route('/upload/stream', methods=['POST'])
+def upload_audio_stream():
+    """Stream transcript segments as newline-delimited JSON while transcription is running."""
+    from src.audio_utils import iter_transcript_segments
+    pcm, model_option, digest, error_response = read_audio_request()
+    if error_response:
+        return error_response
+    model_option, decision = schedule_transcription(pcm, model_option, digest)
+
+    def generate():
+        if decision:
+            yield json.dumps({'model': decision.to_dict()}) + '\n'
+        texts = []
         try:
-            audio_file.save(audio_filepath)
-            logger.info("Audio file saved to %s", audio_filepath)
-            converted_audio_filename = f"converted_{uuid.uuid4().hex}.wav"
-            converted_audio_filepath = os.path.join(app.config['UPLOAD_FOLDER'], converted_audio_filename)
-            convert_audio(audio_filepath=audio_filepath, converted_audio_filepath=converted_audio_filepath)
-            logger.info("Audio file converted to 16-bit PCM WAV: %s", converted_audio_filepath) 
-            audio_filepath = converted_audio_filepath
+            for segment in iter_transcript_segments(pcm, model_option, digest):
+                texts.append(segment['text'])
+                yield json.dumps({'segment': segment}) + '\n'
         except Exception as e:
-            logger.exception("Failed to process audio file: %s", e)
-            return jsonify({'error': str(e)}), 500
-
-        transcript = transcribe_audio_with_whisper(
-            audio_path=audio_filepath,
-            model=model_option
-        )
-        return jsonify({'transcript': transcript}), 200
-    else:
-        logger.error("Audio file type not allowed")
-        return jsonify({'error': 'File type not allowed'}), 400
+            logger.exception("Error during streamed transcription: %s", e)
+            yield json.dumps({'error': str(e)}) + '\n'
+            return
+        yield json.dumps({'transcript': " ".join(texts)}) + '\n'
+        if not (decision and decision.refine):
+            return
+        # The accurate transcript is polled from the job, so no request thread waits for it
+        job = start_refinement(pcm, digest, decision)
+        if job:
+            yield json.dumps({'refining': refinement_info(job)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def read_limited_body(limit: int):
+    """Return the request body, or None if it is longer than `limit` bytes, with or without a Content-Length."""
+    if request.content_length is not None and request.content_length > limit:
+        return None
+    chunks, size = [], 0
+    while size <= limit:
+        chunk = request.stream.read(min(AUDIO_READ_CHUNK_SIZE, limit + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks) if size <= limit else None
+
+def get_live_session(session_id):
+    from src.live_transcription import get_live_session_manager
+    session = get_live_session_manager().get(session_id)
+    if session is None:
+        abort(404)
+    return session
+
+@app.route('/record/start', methods=['POST'])
+def record_start():
+    """Start a live recording session; its audio is sent to /record/<id>/chunk while recording."""
+    from src.live_transcription import get_live_session_manager, SessionLimitError
+    try:
+        model_option = int(request.values.get('option', 1))
+    except ValueError:
+        return jsonify({'error': 'Invalid model option'}), 400
+    try:
+        session = get_live_session_manager().start(model_option)
+    except SessionLimitError as e:
+        logger.warning("Rejecting live recording: %s", e)
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    return jsonify({
+        'session_id': session.id,
+        'chunk_url': url_for('record_chunk', session_id=session.id),
+        'stop_url': url_for('record_stop', session_id=session.id),
+        'cancel_url': url_for('record_cancel', session_id=session.id),
+    }), 201
+
+@app.route('/record/<session_id>/chunk', methods=['POST'])
+def record_chunk(session_id):
+    """
+    Append the next piece of the recording (raw MediaRecorder bytes, in order).
+
+    Answers with the transcript segments completed since segment number `since`.
+    """
+    from src.live_transcription import get_live_session_manager
+    session = get_live_session(session_id)
+    data = read_limited_body(LIVE_MAX_CHUNK_BYTES)
+    if data is None:
+        return jsonify({'error': 'Chunk too large'}), 413
+    try:
+        session.feed(data)
+    except RuntimeError as e:
+        logger.error("Live session %s failed: %s", session_id, e)
+        get_live_session_manager().remove(session_id)
+        return jsonify({'error': str(e)}), 500
+    since = request.args.get('since', 0, type=int)
+    return jsonify({'segments': session.segments_since(since), 'seconds': round(session.seconds_decoded, 2)}), 200
+
+@app.route('/record/<session_id>/stop', methods=['POST'])
+def record_stop(session_id):
+    """Finish a live recording, optionally with a last chunk in the body, and return the whole transcript."""
+    from src.live_transcription import get_live_session_manager
+    session = get_live_session(session_id)
+    try:
+        data = read_limited_body(LIVE_MAX_CHUNK_BYTES)
+        if data is None:
+            return jsonify({'error': 'Chunk too large'}), 413
+        if data:
+            session.feed(data)
+        segments = session.finish(LIVE_FINISH_TIMEOUT)
+    except RuntimeError as e:
+        logger.error("Live session %s failed: %s", session_id, e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        get_live_session_manager().remove(session_id)
+    logger.info("Live session %s finished with %.1fs of audio", session_id, session.seconds_decoded)
+    return jsonify({'transcript': " ".join(segment['text'] for segment in segments), 'segments': segments}), 200
+
+@app.route('/record/<session_id>', methods=['DELETE'])
+def record_cancel(session_id):
+    from src.live_transcription import get_live_session_manager
+    get_live_session(session_id)
+    get_live_session_manager().remove(session_id)
+    return '', 204
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not get_job_manager().cancel(job_id):
+        return jsonify({'error': 'Job not found or already finished'}), 404
+    return jsonify(get_job_manager().get(job_id).to_dict()), 200
+
+@app.route('/healthz')
+def healthz():
+    """Liveness check for load balancers and process supervisors; cheap enough to poll every second."""
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'queues': get_job_manager().queue_depths()}), 200
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for this process."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/whisper/stats')
+def whisper_stats():
+    return jsonify(get_model_registry().stats()), 200
+
+@app.route('/whisper/scheduler')
+def whisper_scheduler_stats():
+    return jsonify(get_whisper_scheduler().stats()), 200
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+    if secure_filename(filename) != filename:
+        abort(404)
+    return send_report(filename)
 
-if __name__ == '__main__':
-    import webbrowser
-    from threading import Timer
+@app.route('/reports/stats')
+def report_store_stats():
+    return jsonify(get_pdf_store().stats()), 200
+
+def run_dev_server(port: int = 5000, open_browser: bool = True) -> None:
+    """Run Flask's development server, importing the pipelines in the background while it starts."""
+    if STARTUP_WARMUP:
+        from src.startup import start_import_warmup
+        start_import_warmup()
+    if open_browser:
+        import webbrowser
+        from threading import Timer
+
+        def open_browser_tab():
+            webbrowser.open(f"http://127.0.0.1:{port}")
 
-    def open_browser():
-        webbrowser.open("http://127.0.0.1:5000")
+        # Start a timer to open the browser after a short delay
+        Timer(1, open_browser_tab).start()
+    app.run(port=port, debug=False)
 
-    # Start a timer to open the browser after a short delay
-    Timer(1, open_browser).start()
-    app.run(debug=False)
\ No newline at end of file
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ReportEase development server")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Report per-module import cost and time to first request, then exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from src.startup import profile_startup
+        profile_startup()
+    else:
+        run_dev_server()
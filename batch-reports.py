@@ -0,0 +1,55 @@
+"""
+Generate reports in bulk from a CSV or JSONL file.
+
+Each item needs a "text" field and may have "id", "signature" (path to a PNG)
+and "document" (path to a PDF or image). Examples:
+
+    python batch-reports.py shifts.jsonl --out reports/
+    python batch-reports.py shifts.csv --zip reports.zip --llm-concurrency 8
+
+Directory output keeps a manifest.jsonl of finished items; re-running the same
+command after a crash skips them. Both outputs include timings.json.
+"""
+import argparse
+import os
+import sys
+from config import BATCH_LLM_CONCURRENCY, BATCH_RENDER_WORKERS, logger
+from src.batch import DirectorySink, ZipSink, load_batch_items, run_batch
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL file with one report per row")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out", help="Directory to write <id>.pdf files to (resumable)")
+    output.add_argument("--zip", help="ZIP archive to write")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--render-workers", type=int, default=BATCH_RENDER_WORKERS)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    try:
+        with open(args.input, encoding="utf-8", newline="") as f:
+            items = load_batch_items(f, fmt)
+    except ValueError as e:
+        logger.error("Invalid batch file: %s", e)
+        return 2
+
+    zip_file = open(args.zip, "wb") if args.zip else None
+    sink = ZipSink(zip_file) if zip_file else DirectorySink(args.out)
+    failed = 0
+    try:
+        for done, record in enumerate(run_batch(items, sink, llm_concurrency=args.llm_concurrency,
+                                                render_workers=args.render_workers), start=1):
+            failed += record["status"] != "ok"
+            logger.info("[%d/%d] %s %s in %.2fs", done, len(items), record["id"], record["status"], record["total_s"])
+    finally:
+        if zip_file:
+            zip_file.close()
+    print(f"Timing report written to {os.path.join(args.out, 'timings.json') if args.out else args.zip}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Measure PDF rendering throughput of src.reporting.
+
+    python -m benchmarks.bench_reporting --sections 10 --iterations 200
+
+--cold clears the template, timezone and signature caches before every report,
+which approximates the per-report work done before they existed.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+from typing import Any, Dict
+from PIL import Image
+from src import reporting
+
+SECTION_TEXT = (
+    "The inspection covered all production lines listed in the shift plan. No deviations from the approved "
+    "procedure were observed, and all measurements were within tolerance. "
+) * 6
+
+
+def make_signature(path: str, width: int = 2400, height: int = 800) -> str:
+    """Write a semi-transparent PNG roughly the size of a phone scan of a signature."""
+    Image.new("RGBA", (width, height), (20, 20, 120, 160)).save(path)
+    return path
+
+
+def clear_caches() -> None:
+    reporting._templates.clear()
+    reporting._signatures.clear()
+    reporting.get_local_timezone.cache_clear()
+
+
+def run_render_benchmark(sections: int, iterations: int, signature_path: str, cold: bool = False) -> Dict[str, Any]:
+    """Render `iterations` reports in memory and return timing statistics in seconds."""
+    content = {f"Section {index + 1}": SECTION_TEXT for index in range(sections)}
+    timings = []
+    with warnings.catch_warnings():
+        # fpdf2 emits a DeprecationWarning for the ln= argument on every cell
+        warnings.simplefilter("ignore", DeprecationWarning)
+        for _ in range(iterations):
+            if cold:
+                clear_caches()
+            start = time.perf_counter()
+            reporting.render_report_bytes(content, "Benchmark Report", signature_path)
+            timings.append(time.perf_counter() - start)
+    return {
+        "sections": sections,
+        "iterations": iterations,
+        "cold": cold,
+        "mean_s": statistics.mean(timings),
+        "p50_s": statistics.median(timings),
+        "p95_s": sorted(timings)[int(0.95 * (len(timings) - 1))],
+        "reports_per_s": len(timings) / sum(timings),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--cold", action="store_true", help="Clear render caches before every report")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        signature_path = make_signature(os.path.join(tmp, "signature.png"))
+        result = run_render_benchmark(args.sections, args.iterations, signature_path, cold=args.cold)
+    print(f"{result['sections']} sections, {result['iterations']} reports{' (cold)' if result['cold'] else ''}: "
+          f"mean {result['mean_s'] * 1000:.1f} ms, p95 {result['p95_s'] * 1000:.1f} ms, "
+          f"{result['reports_per_s']:.1f} reports/s per core")
+
+
+if __name__ == "__main__":
+    main()
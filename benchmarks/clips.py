@@ -0,0 +1,50 @@
+"""
+Reference audio clips for the benchmarks, built from test-cvtd.wav.
+
+The recording is repeated up to each length, so every clip is real speech.
+Clips come in two forms: 16 kHz mono (what Whisper gets) and 44.1 kHz stereo
+(what a browser or phone uploads, so converting it does real resampling).
+"""
+import os
+import wave
+from typing import Dict, Iterable
+import numpy as np
+from config import BASE_DIR
+
+SOURCE_CLIP = os.path.join(BASE_DIR, "test-cvtd.wav")
+SAMPLE_RATE = 16000
+UPLOAD_SAMPLE_RATE = 44100
+
+
+def load_pcm(path: str) -> np.ndarray:
+    """Read a 16-bit mono WAV as float32 samples in [-1, 1]."""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            raise ValueError(f"{path} is not 16-bit mono")
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _write_wav(path: str, samples: np.ndarray, rate: int, channels: int) -> None:
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+
+def make_reference_clips(folder: str, durations: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """Write each clip once. Returns {seconds: {"pcm": 16 kHz mono path, "upload": 44.1 kHz stereo path}}."""
+    os.makedirs(folder, exist_ok=True)
+    source = load_pcm(SOURCE_CLIP)
+    clips = {}
+    for seconds in durations:
+        paths = {"pcm": os.path.join(folder, f"clip_{seconds}s_16k.wav"),
+                 "upload": os.path.join(folder, f"clip_{seconds}s_44k_stereo.wav")}
+        if not all(os.path.exists(path) for path in paths.values()):
+            samples = np.resize(source, seconds * SAMPLE_RATE)
+            _write_wav(paths["pcm"], samples, SAMPLE_RATE, 1)
+            upload_times = np.arange(seconds * UPLOAD_SAMPLE_RATE) / UPLOAD_SAMPLE_RATE
+            resampled = np.interp(upload_times, np.arange(len(samples)) / SAMPLE_RATE, samples)
+            _write_wav(paths["upload"], np.repeat(resampled, 2), UPLOAD_SAMPLE_RATE, 2)
+        clips[seconds] = paths
+    return clips
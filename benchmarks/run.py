@@ -0,0 +1,400 @@
+"""
+End-to-end benchmark suite with regression gates.
+
+    python -m benchmarks.run                                   # every suite, results in benchmarks/results.json
+    python -m benchmarks.run --suites render,agent --quick
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.2
+
+Suites:
+  convert     convert_audio() and in-memory decoding of 44.1 kHz stereo reference clips (needs ffmpeg)
+  transcribe  transcription of 16 kHz reference clips with each Whisper model
+  agent       ReportAgent.generate() in single and sectioned mode at 1, 10 and 100 sections
+  render      PDF rendering at 1, 10 and 100 sections
+  load        /submit and /upload through the development server at increasing concurrency
+
+The LLM is always the stub from benchmarks.stub_ollama, whose latency is fixed,
+so the agent and load numbers measure our side of the pipeline. Whisper is the
+real whisper.cpp unless --stub-whisper swaps in benchmarks.stub_whisper; the
+two are never compared with each other. Uploads, reports and caches go to a
+temporary folder, and every request carries unique text or audio so no cache
+answers it.
+
+With --baseline, the median time (p50_s) and load-test throughput of every
+benchmark are compared to the baseline and the run exits with status 1 if any
+got worse by more than --threshold. Baselines are machine specific: record one
+on the machine that runs the comparison.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import httpx
+from benchmarks import sandbox
+from benchmarks.clips import make_reference_clips, load_pcm
+from benchmarks.stub_ollama import StubOllama
+
+SUITES = ("convert", "transcribe", "agent", "render", "load")
+SECTIONS = (1, 10, 100)
+CLIP_SECONDS = (10, 60, 180)
+CONCURRENCY = (1, 4, 16)
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.json")
+
+# Metrics compared against the baseline, and whether lower or higher is better
+GATES: Dict[str, str] = {"p50_s": "lower", "throughput_per_s": "higher"}
+# Time differences below this are noise, whatever the relative change
+MIN_DELTA_SECONDS = 0.001
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    timings = sorted(timings)
+    return {
+        "n": len(timings),
+        "mean_s": statistics.mean(timings),
+        "p50_s": statistics.median(timings),
+        "p95_s": timings[int(0.95 * (len(timings) - 1))],
+        "min_s": timings[0],
+    }
+
+
+def time_calls(fn: Callable[[], Any], iterations: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_convert(clips: Dict[int, Dict[str, str]], workdir: str, iterations: int) -> Dict[str, Any]:
+    if shutil.which("ffmpeg") is None:
+        return {"convert": {"skipped": "ffmpeg not found"}}
+    from src.audio_utils import convert_audio, decode_audio_to_pcm
+
+    results = {}
+    output = os.path.join(workdir, "converted.wav")
+    for seconds, paths in clips.items():
+        def decode() -> None:
+            with open(paths["upload"], "rb") as f:
+                decode_audio_to_pcm(f)
+
+        results[f"convert_audio {seconds}s"] = summarize(
+            time_calls(lambda: convert_audio(paths["upload"], output), iterations))
+        results[f"decode_audio {seconds}s"] = summarize(time_calls(decode, iterations))
+    return results
+
+
+def bench_transcribe(clips: Dict[int, Dict[str, str]], iterations: int, backend: str) -> Dict[str, Any]:
+    if backend == "whisper.cpp":
+        try:
+            import pywhispercpp  # noqa: F401
+        except ImportError:
+            return {"transcribe": {"skipped": "pywhispercpp is not installed, use --stub-whisper"}}
+    from config import LOW_MODEL, HIGH_MODEL
+    from src.audio_utils import transcribe_audio_with_whisper
+
+    results = {}
+    for option, model_name in ((1, LOW_MODEL), (2, HIGH_MODEL)):
+        for seconds, paths in clips.items():
+            pcm = load_pcm(paths["pcm"])
+            # The warm-up call loads the model; no digest, so the transcript cache is not used
+            timings = time_calls(lambda: transcribe_audio_with_whisper(pcm, option), iterations)
+            result = summarize(timings)
+            result.update(backend=backend, real_time_factor=result["p50_s"] / seconds)
+            results[f"transcribe {model_name} {seconds}s"] = result
+    return results
+
+
+def bench_agent(stub: StubOllama, sections: Tuple[int, ...], iterations: int) -> Dict[str, Any]:
+    from src.agent import ReportAgent
+
+    results = {}
+    for mode in ("single", "sectioned"):
+        agent = ReportAgent(cache=None, mode=mode)
+        for count in sections:
+            stub.sections = count
+            requests_before = stub.requests
+            timings = time_calls(lambda: agent.generate(f"Benchmark input with {count} sections"), iterations)
+            result = summarize(timings)
+            result["llm_calls"] = (stub.requests - requests_before) // (iterations + 1)
+            results[f"agent {mode} {count} sections"] = result
+    stub.sections = 3
+    return results
+
+
+def bench_render(sections: Tuple[int, ...], workdir: str, iterations: int) -> Dict[str, Any]:
+    from benchmarks.bench_reporting import make_signature, run_render_benchmark
+
+    signature_path = make_signature(os.path.join(workdir, "signature.png"))
+    results = {}
+    for count in sections:
+        result = run_render_benchmark(count, iterations, signature_path)
+        results[f"render {count} sections"] = {key: result[key] for key in ("mean_s", "p50_s", "p95_s")}
+        results[f"render {count} sections"]["n"] = iterations
+    return results
+
+
+class DevServer:
+    """The app's development server in a subprocess, sandboxed in `workdir`."""
+
+    def __init__(self, workdir: str, ollama_url: str, stub_whisper: bool) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        command = [sys.executable, "-m", "benchmarks.server", "--port", str(self.port),
+                   "--workdir", os.path.join(workdir, "server"), "--ollama-url", ollama_url]
+        if stub_whisper:
+            command.append("--stub-whisper")
+        self.log_path = os.path.join(workdir, "server.log")
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen(command, stdout=self._log, stderr=subprocess.STDOUT,
+                                        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def wait_ready(self, timeout: float = 120.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Benchmark server exited with code {self.process.returncode}, see {self.log_path}")
+            try:
+                if httpx.get(f"{self.url}/healthz", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        raise RuntimeError(f"Benchmark server did not start within {timeout:.0f}s")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+        self._log.close()
+
+
+def run_load(url: str, make_request: Callable[[httpx.Client, int], httpx.Response], concurrency: int,
+             total: int) -> Dict[str, Any]:
+    """Send `total` requests from `concurrency` client threads and return latency and throughput."""
+    timings: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client_loop() -> None:
+        nonlocal errors
+        with httpx.Client(base_url=url, timeout=600) as client:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    ok = make_request(client, index).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    timings.append(elapsed)
+                    errors += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client_loop) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+    result = summarize(timings)
+    result.update(concurrency=concurrency, errors=errors, throughput_per_s=len(timings) / wall)
+    return result
+
+
+def bench_load(stub: StubOllama, clips: Dict[int, Dict[str, str]], workdir: str, concurrency: Tuple[int, ...],
+               requests_per_client: int, stub_whisper: bool) -> Dict[str, Any]:
+    from benchmarks.bench_reporting import make_signature
+
+    signature_path = make_signature(os.path.join(workdir, "load_signature.png"), 600, 200)
+    with open(signature_path, "rb") as f:
+        signature = f.read()
+    shortest = min(clips)
+    with open(clips[shortest]["upload"], "rb") as f:
+        audio = f.read()
+    run_id = os.urandom(4).hex()
+
+    def submit(client: httpx.Client, index: int) -> httpx.Response:
+        # Unique text per request, so the LLM cache never answers
+        return client.post("/submit", data={"user_text": f"Load test {run_id} request {index}"},
+                           files={"signature": ("signature.png", signature, "image/png")})
+
+    def upload(client: httpx.Client, index: int) -> httpx.Response:
+        # Overwrite the last samples with the request number, so the transcript cache never answers
+        unique = audio[:-8] + index.to_bytes(8, "little")
+        return client.post("/upload", data={"option": "1"}, files={"audio": ("clip.wav", unique, "audio/wav")})
+
+    endpoints = [("/submit", submit)]
+    results: Dict[str, Any] = {}
+    if shutil.which("ffmpeg") is None:
+        results["load /upload"] = {"skipped": "ffmpeg not found"}
+    elif not stub_whisper and not _has_whisper():
+        results["load /upload"] = {"skipped": "pywhispercpp is not installed, use --stub-whisper"}
+    else:
+        endpoints.append(("/upload", upload))
+
+    server = DevServer(workdir, stub.url, stub_whisper)
+    try:
+        server.wait_ready()
+        for path, make_request in endpoints:
+            with httpx.Client(base_url=server.url, timeout=600) as client:
+                make_request(client, -1)  # Warm-up: imports and model loads
+            for clients in concurrency:
+                result = run_load(server.url, make_request, clients, clients * requests_per_client)
+                if path == "/upload":
+                    result["backend"] = "stub" if stub_whisper else "whisper.cpp"
+                results[f"load {path} c={clients}"] = result
+    finally:
+        server.stop()
+    return results
+
+
+def _has_whisper() -> bool:
+    try:
+        import pywhispercpp  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print every gated metric next to its baseline and return the regressions."""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or "skipped" in result or "skipped" in previous:
+            continue
+        if result.get("backend") != previous.get("backend"):
+            print(f"{name:<40} not compared: {previous.get('backend')} baseline, {result.get('backend')} now")
+            continue
+        for metric, better in GATES.items():
+            if metric not in result or metric not in previous or not previous[metric]:
+                continue
+            old, new = previous[metric], result[metric]
+            change = (new - old) / old
+            worse = change > threshold if better == "lower" else change < -threshold
+            if metric.endswith("_s") and abs(new - old) < MIN_DELTA_SECONDS:
+                worse = False
+            flag = "  REGRESSION" if worse else ""
+            print(f"{name:<40} {metric:<18} {old:>12.4f} {new:>12.4f} {change:>+7.1%}{flag}")
+            if worse:
+                regressions.append(f"{name}: {metric} {old:.4f} -> {new:.4f} ({change:+.1%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"\n{'benchmark':<40} {'p50':>10} {'p95':>10} {'n':>5}  extra")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<40} skipped: {result['skipped']}")
+            continue
+        extra = []
+        if "throughput_per_s" in result:
+            extra.append(f"{result['throughput_per_s']:.1f} req/s, {result['errors']} errors")
+        if "real_time_factor" in result:
+            extra.append(f"RTF {result['real_time_factor']:.3f} ({result['backend']})")
+        if "llm_calls" in result:
+            extra.append(f"{result['llm_calls']} LLM calls")
+        print(f"{name:<40} {result['p50_s'] * 1000:>8.1f}ms {result['p95_s'] * 1000:>8.1f}ms {result['n']:>5}  "
+              f"{'; '.join(extra)}")
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations and shorter clips, for a smoke run")
+    parser.add_argument("--stub-whisper", action="store_true", help="Use the Whisper stand-in instead of whisper.cpp")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Also write the results to PATH as the new baseline")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    iterations = 3 if args.quick else 20
+    clip_seconds = CLIP_SECONDS[:2] if args.quick else CLIP_SECONDS
+    concurrency = CONCURRENCY[:2] if args.quick else CONCURRENCY
+    requests_per_client = 3 if args.quick else 10
+
+    workdir = tempfile.mkdtemp(prefix="reportease-bench-")
+    stub = StubOllama().start()
+    # Before anything imports the app: sandbox its folders and send LLM calls to the stub
+    sandbox.configure(workdir, stub.url, log_level=None if args.verbose else logging.WARNING)
+    if args.stub_whisper:
+        from benchmarks import stub_whisper
+        stub_whisper.install()
+    backend = "stub" if args.stub_whisper else "whisper.cpp"
+
+    results: Dict[str, Any] = {}
+    try:
+        clips = make_reference_clips(os.path.join(workdir, "clips"), clip_seconds)
+        for suite in suites:
+            print(f"Running {suite} benchmarks...", flush=True)
+            if suite == "convert":
+                results.update(bench_convert(clips, workdir, iterations))
+            elif suite == "transcribe":
+                results.update(bench_transcribe(clips, max(1, iterations // 4), backend))
+            elif suite == "agent":
+                results.update(bench_agent(stub, SECTIONS, iterations))
+            elif suite == "render":
+                results.update(bench_render(SECTIONS, workdir, iterations * 5))
+            elif suite == "load":
+                results.update(bench_load(stub, clips, workdir, concurrency, requests_per_client, args.stub_whisper))
+    finally:
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    report = {"environment": environment(), "suites": suites, "quick": args.quick, "results": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("cpu_count") != os.cpu_count():
+            print("Warning: the baseline was recorded on a machine with a different CPU count")
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
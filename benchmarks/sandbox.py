@@ -0,0 +1,25 @@
+"""
+Point the app's folders and Ollama URL somewhere else for a benchmark run.
+
+The src modules copy their settings from config at import time, so
+configure() has to run before any of them is imported.
+"""
+import os
+import sys
+from typing import Optional
+import config
+
+
+def configure(workdir: str, ollama_url: Optional[str] = None, log_level: Optional[int] = None) -> None:
+    """Move every folder under BASE_DIR (uploads, reports, caches, profiles) into `workdir`."""
+    loaded = sorted(name for name in sys.modules if name.startswith("src."))
+    if loaded:
+        raise RuntimeError(f"configure() must run before importing the app, already imported: {', '.join(loaded)}")
+    base = config.BASE_DIR + os.sep
+    for name, value in vars(config).items():
+        if name.isupper() and isinstance(value, str) and value.startswith(base):
+            setattr(config, name, os.path.join(workdir, value[len(base):]))
+    if ollama_url:
+        config.OLLAMA_BASE_URL = ollama_url
+    if log_level is not None:
+        config.logger.setLevel(log_level)
@@ -0,0 +1,28 @@
+"""
+Run the development server against a sandbox folder, for the load tests.
+
+    python -m benchmarks.server --port 5055 --workdir /tmp/bench --ollama-url http://127.0.0.1:11555 --stub-whisper
+"""
+import argparse
+import logging
+from benchmarks import sandbox
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workdir", required=True)
+    parser.add_argument("--ollama-url")
+    parser.add_argument("--stub-whisper", action="store_true", help="Use the deterministic Whisper stand-in")
+    args = parser.parse_args()
+
+    sandbox.configure(args.workdir, args.ollama_url, log_level=logging.WARNING)
+    if args.stub_whisper:
+        from benchmarks import stub_whisper
+        stub_whisper.install()
+    import app
+    app.run_dev_server(port=args.port, open_browser=False)
+
+
+if __name__ == "__main__":
+    main()
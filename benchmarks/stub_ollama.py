@@ -0,0 +1,170 @@
+"""
+Local stand-in for the Ollama HTTP API with deterministic latency.
+
+    python -m benchmarks.stub_ollama --port 11555 --sections 10
+
+Answers /api/chat (streaming and not) with a fixed report, outline, section or
+summary depending on the JSON schema in the request's "format", so
+ReportAgent runs unchanged against it. Every response waits
+`first_token_latency` seconds and then `chunk_interval` seconds per streamed
+chunk of `chunk_chars` characters, so a run's LLM time is known in advance and
+anything above it is overhead on our side.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+SECTION_WORDS = 60
+
+
+class StubOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, sections: int = 3, first_token_latency: float = 0.05,
+                 chunk_interval: float = 0.001, chunk_chars: int = 16) -> None:
+        self.sections = sections
+        self.first_token_latency = first_token_latency
+        self.chunk_interval = chunk_interval
+        self.chunk_chars = chunk_chars
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, body: Dict[str, Any]) -> str:
+        """The assistant message for a chat request, chosen by the schema it asks for."""
+        schema = body.get("format")
+        properties = schema.get("properties", {}) if isinstance(schema, dict) else {}
+        text = " ".join(["The inspection found no deviations from the approved procedure."] * (SECTION_WORDS // 8))
+        if "headings" in properties:
+            return json.dumps({"Title": "Benchmark Report",
+                               "headings": [f"Section {index + 1}" for index in range(self.sections)]})
+        if "paragraphs" in properties:
+            return json.dumps({"Title": "Benchmark Report",
+                               "paragraphs": [{"key": f"Section {index + 1}", "text": text}
+                                              for index in range(self.sections)]})
+        if "text" in properties:
+            return json.dumps({"text": text})
+        return text
+
+    def expected_seconds(self, reply: str) -> float:
+        """Time the stub spends on a streamed reply, excluding network and parsing."""
+        chunks = max(1, -(-len(reply) // self.chunk_chars))
+        return self.first_token_latency + chunks * self.chunk_interval
+
+    def _handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send_json_lines(self, lines: List[Dict[str, Any]], stream: bool) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson" if stream else "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in lines:
+                    if stream and line is not lines[0]:
+                        time.sleep(stub.chunk_interval)
+                    data = (json.dumps(line) + "\n").encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self) -> None:
+                # /api/tags, /api/version: enough for clients that probe the server
+                data = json.dumps({"models": [], "version": "stub"}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                start = time.perf_counter()
+                time.sleep(stub.first_token_latency)
+                if self.path == "/api/generate":
+                    # warm_ollama() only asks for the model to be loaded
+                    self._send_json_lines([{"model": body.get("model"), "response": "", "done": True}], stream=False)
+                    return
+                reply = stub.reply_for(body)
+                prompt_chars = sum(len(str(message.get("content", ""))) for message in body.get("messages", []))
+                stream = body.get("stream", True)
+                pieces = [reply[i:i + stub.chunk_chars] for i in range(0, len(reply), stub.chunk_chars)] or [""]
+                generation_seconds = stub.chunk_interval * len(pieces)
+                if not stream:
+                    time.sleep(generation_seconds)
+                    pieces = [reply]
+                lines = [{"model": body.get("model"), "created_at": "2024-01-01T00:00:00Z",
+                          "message": {"role": "assistant", "content": piece}, "done": False} for piece in pieces]
+                eval_count = -(-len(reply) // 4)
+                lines.append({
+                    "model": body.get("model"), "created_at": "2024-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+                    # Ollama reports durations in nanoseconds; tokens are estimated at 4 characters each
+                    "total_duration": int((time.perf_counter() - start) * 1e9), "load_duration": 0,
+                    "prompt_eval_count": -(-prompt_chars // 4), "prompt_eval_duration": 0,
+                    "eval_count": eval_count,
+                    "eval_duration": int(max(generation_seconds, 1e-6) * 1e9),
+                })
+                if not stream:
+                    final = lines[-1]
+                    final["message"] = lines[0]["message"]
+                    lines = [final]
+                self._send_json_lines(lines, stream)
+
+        return Handler
+
+    def start(self) -> "StubOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOllama":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11555)
+    parser.add_argument("--sections", type=int, default=3, help="Paragraphs per report and headings per outline")
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--chunk-interval", type=float, default=0.001)
+    args = parser.parse_args()
+    stub = StubOllama(args.host, args.port, args.sections, args.first_token_latency, args.chunk_interval)
+    print(f"Stub Ollama listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Stand-in for pywhispercpp's Model with deterministic latency.
+
+install() registers it as `pywhispercpp.model` before the app imports it, so
+the model registry, long-audio mode and the /upload routes run unchanged on
+machines without whisper.cpp or its model files. Loading a model sleeps a fixed
+time per model; transcribing sleeps `real_time_factor` x the audio duration
+and returns one segment per SEGMENT_SECONDS. The numbers measure our pipeline
+around Whisper, not Whisper itself.
+"""
+import sys
+import time
+import types
+import wave
+from typing import Any, Dict, List, Union
+import numpy as np
+
+SEGMENT_SECONDS = 5.0
+SAMPLE_RATE = 16000
+
+# Seconds per model load and per second of audio, roughly in the ratio of whisper.cpp on a laptop CPU
+LOAD_SECONDS: Dict[str, float] = {"base": 0.2, "large-v3-turbo": 1.0}
+REAL_TIME_FACTOR: Dict[str, float] = {"base": 0.01, "large-v3-turbo": 0.05}
+
+
+class Segment:
+    def __init__(self, t0: int, t1: int, text: str) -> None:
+        # Times in 10 ms units, like pywhispercpp
+        self.t0 = t0
+        self.t1 = t1
+        self.text = text
+
+
+class Model:
+    def __init__(self, model: str, n_threads: int = 1, **params: Any) -> None:
+        self.model = model
+        self.n_threads = n_threads
+        time.sleep(LOAD_SECONDS.get(model, 0.2))
+
+    def transcribe(self, media: Union[str, np.ndarray], **params: Any) -> List[Segment]:
+        if isinstance(media, str):
+            with wave.open(media, "rb") as f:
+                seconds = f.getnframes() / f.getframerate()
+        else:
+            seconds = len(media) / SAMPLE_RATE
+        time.sleep(REAL_TIME_FACTOR.get(self.model, 0.01) * seconds)
+        segments = []
+        start = 0.0
+        while start < seconds:
+            end = min(seconds, start + SEGMENT_SECONDS)
+            segments.append(Segment(int(start * 100), int(end * 100), f" Words from {start:.0f} to {end:.0f} seconds."))
+            start = end
+        return segments
+
+
+def install() -> None:
+    """Make `from pywhispercpp.model import Model` return the stand-in in this process and its forks."""
+    package = types.ModuleType("pywhispercpp")
+    module = types.ModuleType("pywhispercpp.model")
+    module.Model = Model
+    package.model = module
+    sys.modules["pywhispercpp"] = package
+    sys.modules["pywhispercpp.model"] = module
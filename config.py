@@ -2,6 +2,14 @@ import os
 import logging
 # LLM Model
 LLM_MODEL = "llama3.2:3b-instruct-q5_K_M"
+OLLAMA_BASE_URL: str = "http://localhost:11434"
+OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the model loaded between requests
+
+# "single": one structured-output call for the whole report.
+# "sectioned": outline first, then expand sections in parallel (set OLLAMA_NUM_PARALLEL on the server to match).
+REPORT_GENERATION_MODE: str = "single"
+REPORT_SECTION_CONCURRENCY: int = 4
+REPORT_SECTION_RETRIES: int = 2
 
 # Base directory for the project
 BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
@@ -9,15 +17,157 @@ BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
 # Folder where uploaded files will be stored
 UPLOAD_FOLDER: str = os.path.join(BASE_DIR, 'uploads')
 
+# Content-addressed upload store: identical uploads share one blob named by its SHA-256.
+# Blobs no request references and that were not used for UPLOAD_BLOB_MIN_AGE seconds are
+# garbage-collected, at most every UPLOAD_GC_INTERVAL seconds.
+UPLOAD_BLOB_FOLDER: str = os.path.join(UPLOAD_FOLDER, 'blobs')
+UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+UPLOAD_BLOB_MIN_AGE: int = 24 * 3600
+UPLOAD_GC_INTERVAL: int = 600
+
+# Generated reports are kept in memory up to PDF_STORE_MEMORY_MAX_BYTES, then spilled to REPORT_FOLDER.
+# Both tiers drop reports after PDF_STORE_TTL seconds; when full, memory evicts the least recently read, disk the oldest.
+REPORT_FOLDER: str = os.path.join(UPLOAD_FOLDER, 'reports')
+PDF_STORE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+PDF_STORE_DISK_MAX_BYTES: int = 1024 * 1024 * 1024
+PDF_STORE_TTL: int = 24 * 3600
+PDF_STORE_EXPIRE_INTERVAL: int = 60  # Seconds between full expiry sweeps on lookups; put() always sweeps
+# Also write every report to disk at once, needed when several processes serve /download.
+# The PDF_STORE_WRITE_THROUGH=1 environment variable turns it on too; gunicorn.conf.py sets it for several workers.
+PDF_STORE_WRITE_THROUGH: bool = False
+
 # Define allowed file extensions for audio uploads
 ALLOWED_EXTENSIONS: set = {'wav', 'mp3', 'ogg'}
 
+# In-memory audio decoding: uploads are kept in RAM up to this size, then spooled to a temp file
+AUDIO_SPOOL_THRESHOLD: int = 16 * 1024 * 1024
+AUDIO_READ_CHUNK_SIZE: int = 64 * 1024
+AUDIO_SAMPLE_RATE: int = 16000
+
 # Folder for storing transcripts
 TRANSCRIPT_FOLDER: str = os.path.join(BASE_DIR, 'transcripts')
 
+# Disk cache of validated LLM reports (only used at temperature 0.0)
+CACHE_FOLDER: str = os.path.join(BASE_DIR, 'cache')
+LLM_CACHE_FOLDER: str = os.path.join(CACHE_FOLDER, 'llm')
+LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+LLM_CACHE_MAX_ENTRIES: int = 10000
+
+# Transcripts cached by audio content hash and Whisper model
+TRANSCRIPT_CACHE_FOLDER: str = os.path.join(CACHE_FOLDER, 'transcripts')
+TRANSCRIPT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+# Map-reduce ingestion of uploaded documents. Token counts are estimated as characters / DOC_CHARS_PER_TOKEN.
+# DOC_CHUNK_TOKENS must leave room for the prompt and summary inside Ollama's context window (num_ctx).
+DOC_CACHE_FOLDER: str = os.path.join(CACHE_FOLDER, 'documents')
+DOC_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+DOC_CHARS_PER_TOKEN: int = 4
+DOC_CHUNK_TOKENS: int = 1500
+DOC_TOKEN_BUDGET: int = 100000  # Source tokens read from one document; later pages are skipped
+DOC_SUMMARY_WORDS: int = 150
+DOC_SUMMARY_CONCURRENCY: int = 4
+
+# Text-layer probing: pages with fewer characters are treated as image-only and sent to OCR
+PDF_PAGE_MIN_CHARS: int = 10
+PDF_PROBE_CACHE_SIZE: int = 256
+
+# OCR of scanned PDFs and images (Tesseract through PyMuPDF), one page per worker process
+# Attached documents other than PDFs and these image types are ignored
+OCR_IMAGE_EXTENSIONS: set = {'png', 'jpg', 'jpeg', 'tif', 'tiff', 'bmp'}
+OCR_DPI: int = 300
+OCR_LANGUAGE: str = "eng"
+OCR_TESSDATA: str = None  # Tesseract language data folder; None falls back to TESSDATA_PREFIX
+OCR_WORKERS: int = os.cpu_count() or 1
+OCR_CACHE_FOLDER: str = os.path.join(CACHE_FOLDER, 'ocr')
+OCR_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
 LOW_MODEL: str = "base"
 HIGH_MODEL: str = "large-v3-turbo"
 
+# Whisper model registry
+WHISPER_PRELOAD: bool = False  # Load LOW_MODEL/HIGH_MODEL at app startup
+WHISPER_POOL_SIZE: int = max(1, (os.cpu_count() or 1) // 4)  # Instances per model
+WHISPER_THREADS_PER_MODEL: int = max(1, (os.cpu_count() or 1) // WHISPER_POOL_SIZE)
+WHISPER_MEMORY_BUDGET_MB: int = 4096
+# Approximate resident size of one loaded instance, used for budget accounting
+WHISPER_MODEL_MEMORY_MB: dict = {
+    "base": 200,
+    "large-v3-turbo": 1700,
+}
+
+# Adaptive model selection for /upload option=0 ("auto"): the most accurate model whose estimated latency
+# (queued and running transcriptions plus this one, from an EWMA of each model's real-time factor) meets
+# WHISPER_LATENCY_SLO_SECONDS. When only LOW_MODEL does and WHISPER_SPECULATIVE is on, its transcript is returned
+# at once and a HIGH_MODEL refinement runs in the background, unless that would take over WHISPER_REFINE_MAX_SECONDS.
+WHISPER_LATENCY_SLO_SECONDS: float = 20.0
+WHISPER_SPECULATIVE: bool = True
+WHISPER_REFINE_MAX_SECONDS: float = 600.0
+# Seconds of processing per second of audio before any transcription has been measured
+WHISPER_RTF_PRIORS: dict = {
+    "base": 0.1,
+    "large-v3-turbo": 0.5,
+}
+WHISPER_RTF_EWMA_ALPHA: float = 0.2
+
+# Long-audio mode: recordings longer than LONG_AUDIO_MIN_SECONDS are split at silences
+# and transcribed in a process pool per model. Every worker loads its own copy of the model, so each pool gets at most
+# LONG_AUDIO_WORKERS workers and no more than fit in WHISPER_MEMORY_BUDGET_MB next to the in-process models.
+LONG_AUDIO_MIN_SECONDS: float = 120.0
+LONG_AUDIO_CHUNK_SECONDS: float = 30.0
+LONG_AUDIO_OVERLAP_SECONDS: float = 1.0
+LONG_AUDIO_SEARCH_SECONDS: float = 5.0  # How far back from a chunk end to look for silence
+LONG_AUDIO_THREADS_PER_WORKER: int = 2
+LONG_AUDIO_WORKERS: int = max(1, (os.cpu_count() or 1) // LONG_AUDIO_THREADS_PER_WORKER)
+
+# Live recording (/record/...): the browser sends MediaRecorder chunks while recording, a per-session
+# ffmpeg process decodes them into a rolling PCM buffer, and every LIVE_WINDOW_SECONDS of audio is
+# transcribed, cut at the quietest point of its last LIVE_SEARCH_SECONDS, while the user is still talking.
+# Sessions live in the process that started them, so with several gunicorn workers the chunks only reach
+# their session behind a proxy with sticky sessions; otherwise the page falls back to a full upload.
+LIVE_WINDOW_SECONDS: float = 15.0
+LIVE_SEARCH_SECONDS: float = 3.0
+LIVE_MAX_SESSIONS: int = 8
+LIVE_SESSION_TIMEOUT: int = 120  # Sessions that received nothing for this long are dropped
+LIVE_MAX_CHUNK_BYTES: int = 4 * 1024 * 1024
+LIVE_MAX_BACKLOG_SECONDS: float = 120.0  # Untranscribed audio a session may buffer before it fails
+LIVE_FINISH_TIMEOUT: float = 60.0  # How long /record/<id>/stop waits for the last window
+
+# Background jobs: worker threads per stage, queued jobs per stage before returning 429,
+# and how long finished job results are kept (seconds)
+JOB_STAGE_WORKERS: dict = {
+    "transcription": 2,
+    "llm": 1,
+    "pdf": 2,
+}
+JOB_QUEUE_SIZE: int = 32
+JOB_RESULT_TTL: int = 3600
+
+# Bulk report generation: concurrent LLM calls, PDF rendering processes, and the item cap of /batch
+BATCH_LLM_CONCURRENCY: int = 4
+BATCH_RENDER_WORKERS: int = os.cpu_count() or 1
+BATCH_API_MAX_ITEMS: int = 1000
+
+# Import the report and audio pipelines in a background thread when the development server starts,
+# instead of on the first request that needs them (wsgi.py always imports them before forking)
+STARTUP_WARMUP: bool = True
+
+# Slow-request profiling: when enabled, the stacks of threads working on a request are sampled every
+# PROFILE_SAMPLE_INTERVAL seconds and written as folded stacks (flamegraph input) for requests slower than the threshold
+PROFILE_SLOW_REQUESTS: bool = False
+PROFILE_THRESHOLD_SECONDS: float = 10.0
+PROFILE_SAMPLE_INTERVAL: float = 0.01
+PROFILE_FOLDER: str = os.path.join(BASE_DIR, 'profiles')
+
+# Production server (gunicorn.conf.py): models are loaded once in the master process and shared
+# copy-on-write by SERVER_WORKERS forked workers, each serving SERVER_THREADS requests at a time.
+SERVER_BIND: str = "0.0.0.0:8000"
+SERVER_WORKERS: int = 2
+SERVER_THREADS: int = 4
+SERVER_TIMEOUT: int = 300  # Seconds a worker may stay silent before it is considered hung and restarted
+SERVER_GRACEFUL_TIMEOUT: int = 120  # Seconds in-flight requests get to finish on reload or shutdown
+SERVER_MAX_REQUESTS: int = 0  # Recycle a worker after this many requests (0 = never)
+SERVER_WARM_OLLAMA: bool = True
+
 DEFAULT_FONT_FAMILY: str = 'Arial'
 DEFAULT_HEADER_STYLE: str = 'B'
 DEFAULT_HEADER_SIZE: int = 16
@@ -28,12 +178,19 @@ DEFAULT_BODY_SIZE: int = 12
 DEFAULT_FOOTER_STYLE: str = 'I'
 DEFAULT_FOOTER_SIZE: int = 8
 
+# Report rendering: decoded signature images are cached by content hash and downscaled to this resolution
+SIGNATURE_CACHE_SIZE: int = 64
+SIGNATURE_WIDTH_MM: float = 40
+SIGNATURE_DPI: int = 200
+
 import logging
 
 logger = logging.getLogger('PROJECT_IU')
 logger.setLevel(logging.INFO)
 if not logger.handlers:
     ch = logging.StreamHandler()
-    formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    # request_id is the correlation id set by src.tracing
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s [%(request_id)s]: %(message)s',
+                                  defaults={'request_id': '-'})
     ch.setFormatter(formatter)
     logger.addHandler(ch)
@@ -0,0 +1,38 @@
+# gunicorn settings for the production server, see "Production server" in README.md
+from config import (SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_TIMEOUT, SERVER_GRACEFUL_TIMEOUT,
+                    SERVER_MAX_REQUESTS, logger)
+import os
+
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+worker_class = "gthread"
+threads = SERVER_THREADS
+# Import wsgi.py (and load the models) once in the master, then fork
+preload_app = True
+timeout = SERVER_TIMEOUT
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+max_requests = SERVER_MAX_REQUESTS
+max_requests_jitter = SERVER_MAX_REQUESTS // 10
+# Keep heartbeat files in RAM so a slow disk cannot get healthy workers killed
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = "-"
+
+# Any worker may receive the /download request for a report another worker rendered, see PDF_STORE_WRITE_THROUGH
+raw_env = ["PDF_STORE_WRITE_THROUGH=1"] if SERVER_WORKERS > 1 else []
+
+
+def when_ready(server):
+    logger.info("Serving on %s with %d workers x %d threads", ", ".join(server.cfg.bind), server.cfg.workers,
+                server.cfg.threads)
+    if server.cfg.workers > 1:
+        # gunicorn cannot route a request to a given worker, and live sessions live in the worker that started them
+        logger.info("Live transcription needs 1 worker or a proxy with sticky sessions; otherwise recordings "
+                    "are uploaded whole when they stop")
+
+
+def post_fork(server, worker):
+    logger.info("Worker %s started", worker.pid)
+
+
+def worker_abort(worker):
+    logger.error("Worker %s timed out after %ss and was aborted", worker.pid, SERVER_TIMEOUT)
@@ -1,9 +1,20 @@
-from config import logger, LLM_MODEL
-from typing import Any, Dict, List
-from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from config import (logger, LLM_MODEL, OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, LLM_CACHE_FOLDER,
+                    LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_ENTRIES, REPORT_GENERATION_MODE,
+                    REPORT_SECTION_CONCURRENCY, REPORT_SECTION_RETRIES)
+import json
+import operator
+import httpx
+import threading
+from typing import Annotated, Any, Dict, Iterator, List, Optional, Tuple, TypedDict, Union
+from pydantic import BaseModel, Field, ValidationError
 from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.json import parse_partial_json
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from src.cache import DiskCache, make_cache_key
+from src.metrics import LLM_TOKENS, LLM_TOKENS_PER_SECOND
+from src.tracing import stage, traced
 
 class Paragraph(BaseModel):
     """
@@ -28,6 +39,39 @@ class Report(BaseModel):
     Title: str = Field(..., description="The title of the report")
     paragraphs: List[Paragraph] = Field([], description="A list of paragraphs with keys and text")
 
+class ReportOutline(BaseModel):
+    """
+    Outline produced by the first step of sectioned generation.
+
+    Attributes:
+        Title (str): The title of the report.
+        headings (List[str]): The section headings, in reading order.
+    """
+    Title: str = Field(..., description="The title of the report")
+    headings: List[str] = Field([], description="The section headings of the report, in order")
+
+class SectionText(BaseModel):
+    """Body of a single report section."""
+    text: str = Field(..., description="The full text of the section")
+
+class SectionResult(TypedDict):
+    index: int
+    key: str
+    text: str
+
+class ReportState(TypedDict):
+    input_text: str
+    Title: str
+    headings: List[str]
+    sections: Annotated[List[SectionResult], operator.add]
+
+class SectionState(TypedDict):
+    input_text: str
+    Title: str
+    headings: List[str]
+    index: int
+
+@traced("flatten_report")
 def flatten_report(report: Report) -> dict:
     data = report.__dict__
 
@@ -44,8 +88,37 @@ def flatten_report(report: Report) -> dict:
 
     return flat
 
+def record_llm_usage(message: Optional[BaseMessage]) -> None:
+    """Count the prompt and completion tokens of one LLM response and its generation speed, as reported by Ollama."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind="completion")
+    metadata = getattr(message, "response_metadata", None) or {}
+    eval_count, eval_duration = metadata.get("eval_count"), metadata.get("eval_duration")
+    tokens_per_second = eval_count / (eval_duration / 1e9) if eval_count and eval_duration else None
+    if tokens_per_second:
+        LLM_TOKENS_PER_SECOND.observe(tokens_per_second)
+    logger.info("LLM used %d prompt and %d completion tokens%s", prompt_tokens, completion_tokens,
+                f" ({tokens_per_second:.1f} tokens/s)" if tokens_per_second else "")
+
+def _invoke_structured(model: Any, messages: List[BaseMessage]) -> Any:
+    """Invoke a with_structured_output(include_raw=True) model, record its token usage and return the parsed object."""
+    result = model.invoke(messages)
+    record_llm_usage(result["raw"])
+    if result["parsing_error"] is not None:
+        raise result["parsing_error"]
+    return result["parsed"]
+
+def normalize_input_text(text: str) -> str:
+    """Collapse whitespace so trivially different submissions share a cache entry."""
+    return " ".join(text.split())
+
 class ReportAgent:
-    def __init__(self, temperature: float = 0.0, **model_kwargs: Any) -> None:
+    def __init__(self, temperature: float = 0.0, cache: Optional[DiskCache] = None,
+                 mode: str = REPORT_GENERATION_MODE, **model_kwargs: Any) -> None:
         self.human_msg = (
             "Create a clear, formal, and well-structured report based on the following input: {input_text}. The report should look official."
         )
@@ -56,30 +129,295 @@ class ReportAgent:
             "Your output must follow the given JSON schema."
         )
         logger.info("Initializing ReportAgent with model_choice=%s", LLM_MODEL)
+        self.temperature = temperature
+        # Only deterministic generations are worth caching
+        self.cache = cache if temperature == 0.0 else None
         # self.llm = ChatOpenAI(model=LLM_MODEL, temperature=temperature, **model_kwargs)
+        # The underlying HTTP client keeps its connections to Ollama alive across calls
+        model_kwargs.setdefault("base_url", OLLAMA_BASE_URL)
+        model_kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
         self.llm = ChatOllama(model=LLM_MODEL, temperature=temperature, **model_kwargs)
-        self.model_with_structure = self.llm.with_structured_output(Report)
+        # include_raw keeps the AIMessage, and with it the token counts, next to the parsed object
+        self.model_with_structure = self.llm.with_structured_output(Report, include_raw=True)
+
+        self.mode = mode
+        self.outline_msg = (
+            "Plan a clear, formal, and well-structured report based on the following input: {input_text}. "
+            "Give the report a title and list its section headings in order."
+        )
+        self.outline_instructions = (
+            "You are a professional technical writer planning a formal, structured, and official-looking report."
+            "Only provide the 'Title' and the ordered list of section 'headings'; do not write the sections."
+            "Your output must follow the given JSON schema."
+        )
+        self.section_msg = (
+            "The report '{title}' has the sections: {headings}. "
+            "Write the section '{heading}' based on the following input: {input_text}. The section should look official."
+        )
+        self.section_instructions = (
+            "You are a professional technical writer. Your task is to write one section of a formal, official-looking report."
+            "Write only the body text of the requested section, without repeating its heading."
+            "Your output must follow the given JSON schema."
+        )
+        if mode == "sectioned":
+            self.outline_model = self.llm.with_structured_output(ReportOutline, include_raw=True)
+            self.section_model = self.llm.with_structured_output(SectionText, include_raw=True)
+            self.graph = self._build_section_graph()
+
+    def cache_key(self, text: str) -> str:
+        if self.mode == "sectioned":
+            prompts = (self.outline_instructions, self.outline_msg, self.section_instructions, self.section_msg)
+        else:
+            prompts = (self.section_writer_instructions, self.human_msg)
+        return make_cache_key(normalize_input_text(text), self.mode, prompts, LLM_MODEL, self.temperature)
+
+    def _outline(self, state: ReportState) -> Dict[str, Any]:
+        outline = _invoke_structured(self.outline_model, [
+            SystemMessage(content=self.outline_instructions),
+            HumanMessage(content=self.outline_msg.format(input_text=state["input_text"]))
+        ])
+        logger.info("LLM returned report outline: %s", outline)
+        headings = [heading.strip() for heading in outline.headings if heading.strip()]
+        return {"Title": outline.Title, "headings": list(dict.fromkeys(headings))}
+
+    def _fan_out(self, state: ReportState) -> Union[str, List[Send]]:
+        if not state["headings"]:
+            return END
+        return [
+            Send("expand_section", {"input_text": state["input_text"], "Title": state["Title"],
+                                    "headings": state["headings"], "index": index})
+            for index in range(len(state["headings"]))
+        ]
+
+    def _expand_section(self, state: SectionState) -> Dict[str, Any]:
+        """Write one section, retrying it on its own so a bad section does not fail the report."""
+        heading = state["headings"][state["index"]]
+        final_msg = self.section_msg.format(title=state["Title"], headings="; ".join(state["headings"]),
+                                            heading=heading, input_text=state["input_text"])
+        for attempt in range(1, REPORT_SECTION_RETRIES + 2):
+            try:
+                section = _invoke_structured(self.section_model, [
+                    SystemMessage(content=self.section_instructions),
+                    HumanMessage(content=final_msg)
+                ])
+                if section and section.text.strip():
+                    return {"sections": [{"index": state["index"], "key": heading, "text": section.text}]}
+                logger.warning("Empty text for section '%s' (attempt %d)", heading, attempt)
+            except Exception as e:
+                logger.warning("Failed to write section '%s' (attempt %d): %s", heading, attempt, e)
+        logger.error("Dropping section '%s' after %d attempts", heading, REPORT_SECTION_RETRIES + 1)
+        return {"sections": []}
+
+    def _build_section_graph(self) -> Any:
+        """Outline first, then expand every heading in parallel via Send fan-out."""
+        builder = StateGraph(ReportState)
+        builder.add_node("outline", self._outline)
+        builder.add_node("expand_section", self._expand_section)
+        builder.add_edge(START, "outline")
+        builder.add_conditional_edges("outline", self._fan_out, ["expand_section", END])
+        builder.add_edge("expand_section", END)
+        return builder.compile()
+
+    @staticmethod
+    def _is_complete(headings: List[str], sections: List[SectionResult]) -> bool:
+        """Whether a sectioned generation produced an outline and a section for every heading."""
+        return bool(headings) and {section["index"] for section in sections} == set(range(len(headings)))
+
+    @staticmethod
+    def _assemble(title: str, sections: List[SectionResult]) -> Report:
+        paragraphs = [Paragraph(key=section["key"], text=section["text"])
+                      for section in sorted(sections, key=lambda section: section["index"])]
+        return Report(Title=title, paragraphs=paragraphs)
+
+    def _generate_sectioned(self, text: str) -> Tuple[Report, bool]:
+        """Returns the report and whether it is complete, see _is_complete()."""
+        state = self.graph.invoke(
+            {"input_text": text, "Title": "", "headings": [], "sections": []},
+            config={"max_concurrency": REPORT_SECTION_CONCURRENCY},
+        )
+        return (self._assemble(state["Title"], state["sections"]),
+                self._is_complete(state["headings"], state["sections"]))
+
+    def _generate_single(self, text: str) -> Report:
+        final_msg = self.human_msg.format(input_text = text)
+        return _invoke_structured(self.model_with_structure, [
+            SystemMessage(content=self.section_writer_instructions),
+            HumanMessage(content=final_msg)
+        ])
+
+    def _cached_report(self, key: str) -> Optional[Report]:
+        """Return the cached report for `key`; an entry that no longer validates is deleted and treated as a miss."""
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        try:
+            report = Report.model_validate_json(cached)
+        except ValidationError as e:
+            logger.warning("Discarding unreadable cached report %s: %s", key[:12], e)
+            self.cache.delete(key)
+            return None
+        logger.info("LLM cache hit for report %s", key[:12])
+        return report
+
+    def _cache_report(self, key: str, report: Report, complete: bool) -> None:
+        # A report missing sections would be served for this input forever, so only complete ones are kept
+        if not complete:
+            logger.warning("Not caching incomplete report %s", key[:12])
+            return
+        self.cache.set(key, report.model_dump_json().encode("utf-8"))
 
     def generate(self, text: str) -> Dict[str, Any]:
         """Generate a structured report from the given input text."""
         try:
-            final_msg = self.human_msg.format(input_text = text)
-            result = self.model_with_structure.invoke([
-                SystemMessage(content=self.section_writer_instructions),
-                HumanMessage(content=final_msg)
-            ])
+            key = self.cache_key(text) if self.cache else None
+            cached = self._cached_report(key) if key else None
+            if cached is not None:
+                return cached
+            with stage("llm"):
+                if self.mode == "sectioned":
+                    result, complete = self._generate_sectioned(text)
+                else:
+                    result, complete = self._generate_single(text), True
             logger.info("LLM returned structured report: %s", result)
+            if key and isinstance(result, Report):
+                self._cache_report(key, result, complete)
             return result
         except Exception as e:
             logger.exception("Error during report generation: %s", e)
             return {}
 
+    @staticmethod
+    def _report_events(report: Report) -> Iterator[Dict[str, Any]]:
+        yield {"type": "title", "title": report.Title}
+        for index, paragraph in enumerate(report.paragraphs):
+            yield {"type": "section", "index": index, "key": paragraph.key, "text": paragraph.text}
+
+    def _stream_sectioned(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Forward the outline and every expanded section as soon as its graph node finishes.
+
+        Returns the report and whether it is complete, see _is_complete().
+        """
+        title, headings, sections = "", [], []
+        for update in self.graph.stream(
+            {"input_text": text, "Title": "", "headings": [], "sections": []},
+            config={"max_concurrency": REPORT_SECTION_CONCURRENCY},
+            stream_mode="updates",
+        ):
+            if update.get("outline"):
+                title, headings = update["outline"]["Title"], update["outline"]["headings"]
+                yield {"type": "title", "title": title}
+            for section in (update.get("expand_section") or {}).get("sections", []):
+                sections.append(section)
+                yield {"type": "section", **section}
+        return self._assemble(title, sections), self._is_complete(headings, sections)
+
+    def _stream_single(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the single-call JSON and emit each paragraph once the next one starts.
+
+        The structured-output wrapper only returns the parsed object at the end, so
+        this binds the JSON schema as the response format and parses partial JSON.
+        The raw chunks are merged so the final message carries the token counts.
+        """
+        final_msg = self.human_msg.format(input_text = text)
+        message = None
+        partial: Dict[str, Any] = {}
+        title_sent = False
+        sent = 0
+        for chunk in self.llm.bind(format=Report.model_json_schema()).stream([
+            SystemMessage(content=self.section_writer_instructions),
+            HumanMessage(content=final_msg)
+        ]):
+            message = chunk if message is None else message + chunk
+            try:
+                partial = parse_partial_json(message.content) or partial
+            except json.JSONDecodeError:
+                continue
+            paragraphs = partial.get("paragraphs") or []
+            # The title is complete once the model has moved on to the paragraphs
+            if not title_sent and "paragraphs" in partial:
+                title_sent = True
+                yield {"type": "title", "title": partial.get("Title", "")}
+            while sent < len(paragraphs) - 1:
+                paragraph = Paragraph.model_validate(paragraphs[sent])
+                yield {"type": "section", "index": sent, "key": paragraph.key, "text": paragraph.text}
+                sent += 1
+        record_llm_usage(message)
+        report = Report.model_validate(partial)
+        if not title_sent:
+            yield {"type": "title", "title": report.Title}
+        for index in range(sent, len(report.paragraphs)):
+            paragraph = report.paragraphs[index]
+            yield {"type": "section", "index": index, "key": paragraph.key, "text": paragraph.text}
+        return report
+
+    def stream(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a report incrementally.
+
+        Yields {"type": "title", "title"} once, then {"type": "section", "index", "key", "text"}
+        for each paragraph as it completes. Sections may arrive out of order in sectioned mode.
+        Errors are raised to the caller.
+        """
+        key = self.cache_key(text) if self.cache else None
+        cached = self._cached_report(key) if key else None
+        if cached is not None:
+            yield from self._report_events(cached)
+            return
+        with stage("llm"):
+            if self.mode == "sectioned":
+                report, complete = yield from self._stream_sectioned(text)
+            else:
+                report, complete = (yield from self._stream_single(text)), True
+        logger.info("LLM streamed structured report: %s", report)
+        if key:
+            self._cache_report(key, report, complete)
+
+_agent: Optional[ReportAgent] = None
+_agent_lock = threading.Lock()
+
+def get_report_agent() -> ReportAgent:
+    """Return the long-lived ReportAgent shared by all requests in this process."""
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            cache = DiskCache(LLM_CACHE_FOLDER, max_bytes=LLM_CACHE_MAX_BYTES, max_entries=LLM_CACHE_MAX_ENTRIES)
+            _agent = ReportAgent(cache=cache)
+        return _agent
+
+def warm_ollama(timeout: float = 120.0) -> bool:
+    """
+    Ask Ollama to load LLM_MODEL and keep it for OLLAMA_KEEP_ALIVE, without generating anything.
+
+    Uses a one-off HTTP connection that is closed on return, so it is safe to
+    call in a process that forks workers afterwards.
+    """
+    try:
+        response = httpx.post(f"{OLLAMA_BASE_URL}/api/generate",
+                              json={"model": LLM_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE}, timeout=timeout)
+        response.raise_for_status()
+        logger.info("Ollama model %s is loaded", LLM_MODEL)
+        return True
+    except Exception as e:
+        logger.warning("Could not warm up Ollama model %s: %s", LLM_MODEL, e)
+        return False
+
 def create_structured_report(text_input: str) -> Dict[str, Any]:
     """Generate a structured report dictionary from input text."""
     try:
-        agent = ReportAgent()
+        agent = get_report_agent()
         output = agent.generate(text_input)
         return flatten_report(output)
     except Exception as e:
         logger.exception("An error occurred during report generation: %s", e)
         return {}
+
+
+def stream_structured_report(text_input: str) -> Iterator[Dict[str, Any]]:
+    """Stream report events from the shared agent; see ReportAgent.stream."""
+    return get_report_agent().stream(text_input)
+
+def assemble_streamed_report(title: str, sections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the same flat dictionary as create_structured_report from streamed events."""
+    return flatten_report(ReportAgent._assemble(title, sections))
@@ -1,7 +1,33 @@
+import threading
 import ffmpeg
-from config import logger, LOW_MODEL, HIGH_MODEL
-from pywhispercpp.model import Model
+import numpy as np
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+from config import (logger, LOW_MODEL, HIGH_MODEL, AUDIO_SAMPLE_RATE, AUDIO_READ_CHUNK_SIZE, LONG_AUDIO_MIN_SECONDS,
+                    TRANSCRIPT_CACHE_FOLDER, TRANSCRIPT_CACHE_MAX_BYTES)
+from src.cache import DiskCache, make_cache_key
+from src.long_audio import transcribe_long_audio
+from src.model_registry import get_model_registry
+from src.tracing import traced
+from src.whisper_scheduler import get_whisper_scheduler
 
+_transcript_cache: Optional[DiskCache] = None
+_transcript_cache_lock = threading.Lock()
+
+def get_transcript_cache() -> DiskCache:
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = DiskCache(TRANSCRIPT_CACHE_FOLDER, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES)
+        return _transcript_cache
+
+def get_cached_segments(digest: Optional[str], model: int) -> Optional[List[Dict[str, Any]]]:
+    """Return the cached segments of audio with content hash `digest`, or None."""
+    if not digest:
+        return None
+    model_name = LOW_MODEL if model == 1 else HIGH_MODEL
+    return get_transcript_cache().get_json(make_cache_key(digest, model_name))
+
+@traced("convert_audio")
 def convert_audio(audio_filepath:str, converted_audio_filepath:str) -> bool:
     try:
         (
@@ -14,14 +40,98 @@ def convert_audio(audio_filepath:str, converted_audio_filepath:str) -> bool:
     except Exception as e:
         logger.error(f"Error during conversion: {e}")
         return False
-    
 
-def transcribe_audio_with_whisper(audio_path: str, model: str) -> str:
-    """Transcribe audio using Whisper and return the transcript."""
-    model_instance = Model(LOW_MODEL if model == 1 else HIGH_MODEL)
+
+@traced("decode_audio")
+def decode_audio_to_pcm(stream: BinaryIO, chunk_size: int = AUDIO_READ_CHUNK_SIZE) -> np.ndarray:
+    """
+    Decode an audio stream to 16 kHz mono float32 PCM without touching the disk.
+
+    The stream is fed to ffmpeg's stdin from a helper thread while raw s16le
+    samples are read back from stdout, so neither side can block the other.
+    """
+    process = (
+        ffmpeg
+        .input('pipe:0')
+        .output('pipe:1', format='s16le', acodec='pcm_s16le', ac=1, ar=AUDIO_SAMPLE_RATE)
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+    )
+    stderr_chunks = []
+
+    def feed_stdin() -> None:
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg exited early; its stderr explains why
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def drain_stderr() -> None:
+        stderr_chunks.append(process.stderr.read())
+
+    feeder = threading.Thread(target=feed_stdin, daemon=True)
+    drainer = threading.Thread(target=drain_stderr, daemon=True)
+    feeder.start()
+    drainer.start()
+    raw_pcm = process.stdout.read()
+    feeder.join()
+    drainer.join()
+    if process.wait() != 0:
+        message = b"".join(stderr_chunks).decode(errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed to decode audio: {message}")
+    return np.frombuffer(raw_pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+@traced("transcription")
+def _transcribe_segments(audio: Union[str, np.ndarray], model_name: str) -> Iterator[Dict[str, Any]]:
+    if isinstance(audio, np.ndarray) and len(audio) >= LONG_AUDIO_MIN_SECONDS * AUDIO_SAMPLE_RATE:
+        yield from transcribe_long_audio(audio, model_name)
+        return
+    with get_model_registry().acquire(model_name) as model_instance:
+        segments = model_instance.transcribe(audio)
+    for segment in segments:
+        yield {"start": segment.t0 / 100.0, "end": segment.t1 / 100.0, "text": segment.text}
+
+
+def iter_transcript_segments(audio: Union[str, np.ndarray, None], model: str,
+                             digest: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield transcript segments as {"start", "end", "text"} dicts, times in seconds.
+
+    PCM longer than LONG_AUDIO_MIN_SECONDS goes through the chunk-parallel
+    long-audio mode; everything else uses a warm model from the registry.
+    With the content hash of the original upload as `digest`, segments are
+    cached per model, and `audio` may be None when get_cached_segments() hit.
+    """
+    cached = get_cached_segments(digest, model)
+    if cached is not None:
+        yield from cached
+        return
+    model_name = LOW_MODEL if model == 1 else HIGH_MODEL
+    duration = len(audio) / AUDIO_SAMPLE_RATE if isinstance(audio, np.ndarray) else None
+    segments = []
+    # Counted in the scheduler's backlog while running, and timed to update the model's real-time factor
+    with get_whisper_scheduler().running(model_name, duration):
+        for segment in _transcribe_segments(audio, model_name):
+            segments.append(segment)
+            yield segment
+    if digest:
+        get_transcript_cache().set_json(make_cache_key(digest, model_name), segments)
+
+
+def transcribe_audio_with_whisper(audio: Union[str, np.ndarray, None], model: str, digest: Optional[str] = None) -> str:
+    """Transcribe a WAV path or 16 kHz float32 PCM samples using Whisper and return the transcript."""
     try:
-        segments = model_instance.transcribe(audio_path)
-        transcript = " ".join(segment.text for segment in segments)
+        transcript = " ".join(segment["text"] for segment in iter_transcript_segments(audio, model, digest))
         return transcript
     except Exception as e:
         logger.exception("Error during transcription: %s", e)
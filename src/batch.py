@@ -0,0 +1,292 @@
+import csv
+import io
+import json
+import os
+import statistics
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO
+from werkzeug.utils import secure_filename
+from config import logger, BATCH_LLM_CONCURRENCY, BATCH_RENDER_WORKERS
+from src.document_processor import build_report_content
+from src.jobs import JobManager
+from src.reporting import render_report_bytes
+from src.tracing import submit_in_context
+
+MANIFEST_NAME = "manifest.jsonl"
+TIMINGS_NAME = "timings.json"
+
+
+def load_batch_items(stream: TextIO, fmt: str) -> List[Dict[str, Any]]:
+    """
+    Read batch items from CSV (with a header row) or JSONL.
+
+    Each item needs a "text" field and may have "id", "signature" and "document".
+    Items without an id are numbered by their position. Ids name the output
+    files, so they are reduced to safe file names and must be unique.
+    Raises ValueError for invalid rows.
+    """
+    if fmt == "csv":
+        rows = list(csv.DictReader(stream))
+    elif fmt == "jsonl":
+        rows = [json.loads(line) for line in stream if line.strip()]
+    else:
+        raise ValueError(f"Unsupported batch format: {fmt}")
+    items = []
+    seen: Dict[str, int] = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"Batch item {index} is not an object")
+        if not isinstance(row.get("text"), str) or not row["text"].strip():
+            raise ValueError(f"Batch item {index} has no text")
+        item = {key: value for key, value in row.items() if value not in (None, "")}
+        item["id"] = secure_filename(str(item.get("id", index)))
+        if not item["id"]:
+            raise ValueError(f"Batch item {index} has an invalid id")
+        if item["id"] in seen:
+            raise ValueError(f"Batch items {seen[item['id']]} and {index} have the same id '{item['id']}'")
+        seen[item["id"]] = index
+        items.append(item)
+    return items
+
+
+def _render_item(content: Dict[str, str], signature_path: Optional[str]) -> bytes:
+    """Render one report in a pool worker."""
+    content = dict(content)
+    title = content.pop("Title", "Generated Report")
+    return render_report_bytes(content, title, signature_path)
+
+
+class JobStagePool:
+    """
+    Executor-like front for one stage of a JobManager.
+
+    Every submit() becomes a single-step job on the stage, so batch items share
+    the server's bounded worker pools with other requests. submit() waits while
+    the stage queue is full. Results go to the returned Future only and are
+    not kept in the job.
+    """
+
+    def __init__(self, manager: JobManager, stage: str) -> None:
+        self.manager = manager
+        self.stage = stage
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        future: Future = Future()
+
+        def step(_: Any) -> None:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+                raise
+
+        def on_finish() -> None:
+            if not future.done():
+                future.set_exception(RuntimeError("Job was cancelled"))
+
+        self.manager.submit([(self.stage, step)], on_finish, block=True)
+        return future
+
+
+class DirectorySink:
+    """Write reports as <id>.pdf files next to a progress manifest, which makes the batch resumable."""
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.manifest_path = os.path.join(folder, MANIFEST_NAME)
+
+    def completed_ids(self) -> Set[str]:
+        done = set()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short by a crash
+                        continue
+                    if record.get("status") == "ok":
+                        done.add(record["id"])
+        return done
+
+    def write_report(self, name: str, data: bytes) -> None:
+        path = os.path.join(self.folder, name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def write_record(self, record: Dict[str, Any]) -> None:
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self, summary: Dict[str, Any]) -> None:
+        with open(os.path.join(self.folder, TIMINGS_NAME), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+class ZipSink:
+    """Write reports into a ZIP archive on any writable file object, seekable or not."""
+
+    def __init__(self, fileobj: Any) -> None:
+        # PDFs are already compressed, so store them as-is
+        self.archive = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED)
+        self.records: List[Dict[str, Any]] = []
+
+    def completed_ids(self) -> Set[str]:
+        return set()
+
+    def write_report(self, name: str, data: bytes) -> None:
+        self.archive.writestr(name, data)
+
+    def write_record(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+    def close(self, summary: Dict[str, Any]) -> None:
+        self.archive.writestr(MANIFEST_NAME, "".join(json.dumps(record) + "\n" for record in self.records))
+        self.archive.writestr(TIMINGS_NAME, json.dumps(summary, indent=2))
+        self.archive.close()
+
+
+def summarize_timings(records: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    def describe(values: List[float]) -> Dict[str, Optional[float]]:
+        if not values:
+            return {"mean": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        return {"mean": round(statistics.mean(ordered), 3), "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+                "max": round(ordered[-1], 3)}
+
+    succeeded = [record for record in records if record["status"] == "ok"]
+    return {
+        "items": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(records) - len(succeeded),
+        "wall_s": round(wall_seconds, 3),
+        "items_per_s": round(len(succeeded) / wall_seconds, 3) if wall_seconds else None,
+        "llm_s": describe([record["llm_s"] for record in succeeded]),
+        "render_s": describe([record["render_s"] for record in succeeded]),
+        "total_s": describe([record["total_s"] for record in succeeded]),
+    }
+
+
+def run_batch(items: Iterable[Dict[str, Any]], sink: Any, llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+              render_workers: int = BATCH_RENDER_WORKERS,
+              job_manager: Optional[JobManager] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Generate one report per item and yield a timing record as each one finishes.
+
+    LLM calls run on `llm_concurrency` threads against Ollama while finished
+    contents are rendered on a process pool, so both stages stay busy. With
+    `job_manager` both stages run on its "llm" and "pdf" pools instead of
+    private ones, and `llm_concurrency` only limits the items in flight. Items
+    the sink already completed (from its manifest) are skipped, which resumes
+    an interrupted batch.
+    """
+    completed = sink.completed_ids()
+    todo = iter([item for item in items if item["id"] not in completed])
+    if completed:
+        logger.info("Resuming batch, skipping %d completed items", len(completed))
+    records: List[Dict[str, Any]] = []
+    batch_start = time.perf_counter()
+
+    def finish(item: Dict[str, Any], status: str, started: float, llm_s: float = 0.0, render_s: float = 0.0,
+               error: Optional[str] = None) -> Dict[str, Any]:
+        record = {"id": item["id"], "status": status, "llm_s": round(llm_s, 3), "render_s": round(render_s, 3),
+                  "total_s": round(time.perf_counter() - started, 3)}
+        if status == "ok":
+            record["output"] = f"{item['id']}.pdf"
+        if error:
+            record["error"] = error
+        sink.write_record(record)
+        records.append(record)
+        return record
+
+    with ExitStack() as stack:
+        if job_manager is None:
+            llm_pool = stack.enter_context(ThreadPoolExecutor(max_workers=llm_concurrency))
+            render_pool = stack.enter_context(ProcessPoolExecutor(max_workers=render_workers))
+        else:
+            llm_pool, render_pool = JobStagePool(job_manager, "llm"), JobStagePool(job_manager, "pdf")
+        llm_pending: Dict[Future, tuple] = {}
+        render_pending: Dict[Future, tuple] = {}
+
+        def timed_llm(item: Dict[str, Any]) -> tuple:
+            start = time.perf_counter()
+            content = build_report_content(item["text"], item.get("document"))
+            return content, time.perf_counter() - start
+
+        def refill() -> None:
+            # Keep a small backlog per LLM slot so finished contents never wait on item submission
+            while len(llm_pending) < 2 * llm_concurrency:
+                item = next(todo, None)
+                if item is None:
+                    return
+                llm_pending[submit_in_context(llm_pool, timed_llm, item)] = (item, time.perf_counter())
+
+        refill()
+        while llm_pending or render_pending:
+            done, _ = wait(list(llm_pending) + list(render_pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in llm_pending:
+                    item, started = llm_pending.pop(future)
+                    try:
+                        content, llm_s = future.result()
+                    except Exception as e:
+                        logger.exception("Batch item %s failed in the LLM stage: %s", item["id"], e)
+                        yield finish(item, "failed", started, error=str(e))
+                        continue
+                    if not content:
+                        yield finish(item, "failed", started, llm_s=llm_s, error="Empty report content")
+                        continue
+                    render_future = render_pool.submit(_render_item, content, item.get("signature"))
+                    render_pending[render_future] = (item, started, llm_s, time.perf_counter())
+                else:
+                    item, started, llm_s, render_start = render_pending.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        logger.exception("Batch item %s failed in the PDF stage: %s", item["id"], e)
+                        yield finish(item, "failed", started, llm_s=llm_s, error=str(e))
+                        continue
+                    sink.write_report(f"{item['id']}.pdf", data)
+                    yield finish(item, "ok", started, llm_s=llm_s, render_s=time.perf_counter() - render_start)
+            refill()
+
+    summary = summarize_timings(records, time.perf_counter() - batch_start)
+    sink.close(summary)
+    logger.info("Batch finished: %s", summary)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable file object whose contents are drained by a generator."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_batch_zip(items: List[Dict[str, Any]], **kwargs: Any) -> Iterator[bytes]:
+    """Run a batch and yield a ZIP archive of its reports chunk by chunk as they are produced."""
+    buffer = _StreamBuffer()
+    sink = ZipSink(buffer)
+    for _ in run_batch(items, sink, **kwargs):
+        data = buffer.drain()
+        if data:
+            yield data
+    yield buffer.drain()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import logger
+from src.metrics import record_cache_lookup
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Hash JSON-serializable parts into a stable hex cache key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache with LRU eviction.
+
+    Entries are stored as files named by their key and sharded by the first two
+    hex characters. Recency is tracked through file mtimes, so the LRU order
+    survives restarts. Eviction kicks in when the total size or entry count
+    exceeds its limit.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, max_entries: Optional[int] = None) -> None:
+        self.folder = folder
+        self.name = os.path.basename(folder)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key)
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Scan the cache folder once, oldest entries first. Caller holds the lock."""
+        if self._index is None:
+            entries = []
+            if os.path.isdir(self.folder):
+                for shard in os.listdir(self.folder):
+                    shard_path = os.path.join(self.folder, shard)
+                    if not os.path.isdir(shard_path):
+                        continue
+                    for name in os.listdir(shard_path):
+                        if name.endswith(".tmp"):
+                            continue
+                        stat = os.stat(os.path.join(shard_path, name))
+                        entries.append((stat.st_mtime, name, stat.st_size))
+            entries.sort()
+            self._index = OrderedDict((name, size) for _, name, size in entries)
+            self._total_bytes = sum(self._index.values())
+        return self._index
+
+    def _forget(self, key: str) -> None:
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self) -> None:
+        while self._index and (self._total_bytes > self.max_bytes or
+                               (self.max_entries is not None and len(self._index) > self.max_entries)):
+            key = next(iter(self._index))
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    value = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                # Another process may have evicted it
+                self._forget(key)
+                self.misses += 1
+                record_cache_lookup(self.name, hit=False)
+                return None
+            if key not in index:
+                index[key] = len(value)
+                self._total_bytes += len(value)
+            index.move_to_end(key)
+            self.hits += 1
+            record_cache_lookup(self.name, hit=True)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+            self._forget(key)
+            index[key] = len(value)
+            self._total_bytes += len(value)
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._load_index()
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get_json(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            logger.warning("Discarding corrupt cache entry %s", key)
+            self.delete(key)
+            return None
+
+    def set_json(self, key: str, value: Any) -> None:
+        self.set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "entries": len(index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
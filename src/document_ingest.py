@@ -0,0 +1,165 @@
+import threading
+import fitz
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from langchain_core.messages import HumanMessage, SystemMessage
+from config import (logger, LLM_MODEL, DOC_CACHE_FOLDER, DOC_CACHE_MAX_BYTES, DOC_CHARS_PER_TOKEN,
+                    DOC_CHUNK_TOKENS, DOC_TOKEN_BUDGET, DOC_SUMMARY_WORDS, DOC_SUMMARY_CONCURRENCY)
+from src.agent import get_report_agent, record_llm_usage
+from src.cache import DiskCache, make_cache_key
+from src.upload_store import file_digest
+from src.tracing import submit_in_context, traced
+
+MAP_INSTRUCTIONS = (
+    "You are a professional technical writer. Summarize the given excerpt of a document in at most {words} words."
+    "Keep names, figures, dates and conclusions. Reply with the summary only."
+)
+REDUCE_INSTRUCTIONS = (
+    "You are a professional technical writer. Merge the given partial summaries of one document into a single summary "
+    "of at most {words} words. Keep names, figures, dates and conclusions. Reply with the summary only."
+)
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DiskCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(DOC_CACHE_FOLDER, max_bytes=DOC_CACHE_MAX_BYTES)
+        return _cache
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // DOC_CHARS_PER_TOKEN + 1
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) one page at a time without loading the whole document's text."""
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.number + 1, page.get_text()
+
+
+def split_text(text: str, max_tokens: int = DOC_CHUNK_TOKENS) -> List[str]:
+    """Split text into pieces of at most `max_tokens`, preferring paragraph and line breaks."""
+    max_chars = max_tokens * DOC_CHARS_PER_TOKEN
+    pieces = []
+    while len(text) > max_chars:
+        cut = max(text.rfind("\n\n", 0, max_chars), text.rfind("\n", 0, max_chars), text.rfind(" ", 0, max_chars))
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text.strip():
+        pieces.append(text)
+    return pieces
+
+
+def iter_chunks(file_path: str, token_budget: int = DOC_TOKEN_BUDGET,
+                max_tokens: int = DOC_CHUNK_TOKENS) -> Iterator[str]:
+    """
+    Yield a PDF's text in chunks of at most `max_tokens`, packing consecutive short pages together
+    and splitting oversized ones. Stops before the piece that would exceed `token_budget`.
+    """
+    current: List[str] = []
+    current_tokens = used_tokens = 0
+    for page_number, page_text in iter_pdf_pages(file_path):
+        for piece in split_text(page_text, max_tokens):
+            tokens = estimate_tokens(piece)
+            if used_tokens + tokens > token_budget:
+                logger.warning("Token budget of %d reached, ignoring %s from page %d on",
+                               token_budget, file_path, page_number)
+                if current:
+                    yield "\n\n".join(current)
+                return
+            if current and current_tokens + tokens > max_tokens:
+                yield "\n\n".join(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+            used_tokens += tokens
+    if current:
+        yield "\n\n".join(current)
+
+
+def _summarize(instructions: str, text: str) -> str:
+    """Summarize one piece of text, reusing a cached summary of identical input."""
+    cache = get_document_cache()
+    key = make_cache_key(text, instructions, LLM_MODEL)
+    cached = cache.get_json(key)
+    if cached is not None:
+        return cached
+    response = get_report_agent().llm.invoke([
+        SystemMessage(content=instructions),
+        HumanMessage(content=text)
+    ])
+    record_llm_usage(response)
+    summary = response.content.strip()
+    cache.set_json(key, summary)
+    return summary
+
+
+def _group(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    groups, current, current_tokens = [], [], 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+@traced("summarize_document")
+def summarize_document(file_path: str, token_budget: int = DOC_TOKEN_BUDGET) -> str:
+    """
+    Map-reduce a PDF into one summary that fits the report prompt.
+
+    Pages are extracted one at a time and packed into chunks of up to
+    DOC_CHUNK_TOKENS (oversized pages are split), and each chunk is summarized
+    as soon as it is full, in parallel against Ollama. Summaries are cached by
+    the chunk text, so re-running on a revised file reuses the chunks before
+    the first change. The partial summaries are then
+    merged group by group until they fit in a single chunk. The final summary is
+    also cached by the file's content hash, so a re-uploaded document is not
+    even re-read.
+    """
+    map_instructions = MAP_INSTRUCTIONS.format(words=DOC_SUMMARY_WORDS)
+    reduce_instructions = REDUCE_INSTRUCTIONS.format(words=DOC_SUMMARY_WORDS)
+    cache = get_document_cache()
+    document_key = make_cache_key(file_digest(file_path), token_budget, DOC_CHUNK_TOKENS, map_instructions,
+                                  reduce_instructions, LLM_MODEL)
+    cached = cache.get_json(document_key)
+    if cached is not None:
+        logger.info("Reusing cached summary of %s", file_path)
+        return cached
+    summary = _map_reduce(file_path, token_budget, map_instructions, reduce_instructions)
+    cache.set_json(document_key, summary)
+    return summary
+
+
+def _map_reduce(file_path: str, token_budget: int, map_instructions: str, reduce_instructions: str) -> str:
+    futures: List[Future] = []
+    used_tokens = 0
+    with ThreadPoolExecutor(max_workers=DOC_SUMMARY_CONCURRENCY) as executor:
+        for chunk in iter_chunks(file_path, token_budget):
+            used_tokens += estimate_tokens(chunk)
+            futures.append(submit_in_context(executor, _summarize, map_instructions, chunk))
+        summaries = [future.result() for future in futures]
+        logger.info("Summarized %d chunks (~%d tokens) of %s", len(summaries), used_tokens, file_path)
+
+        while len(summaries) > 1 and sum(estimate_tokens(summary) for summary in summaries) > DOC_CHUNK_TOKENS:
+            groups = _group(summaries, DOC_CHUNK_TOKENS)
+            if len(groups) == len(summaries):
+                # Every summary already fills a chunk on its own; merge pairwise to make progress
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            futures = [submit_in_context(executor, _summarize, reduce_instructions, "\n\n".join(group)) for group in groups]
+            summaries = [future.result() for future in futures]
+    if len(summaries) > 1:
+        return _summarize(reduce_instructions, "\n\n".join(summaries))
+    return summaries[0] if summaries else ""
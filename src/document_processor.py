@@ -1,41 +1,111 @@
-from src.agent import create_structured_report
-from src.pdf_utils import is_pdf_text_extractable, image_to_pdf_with_ocr, pdf_to_pdf_with_ocr
-from src.reporting import generate_report_from_dict
-from config import logger
-from typing import Optional
+from src.agent import create_structured_report, stream_structured_report
+from src.reporting import render_report_bytes
+from src.pdf_store import get_pdf_store
+from src.upload_store import get_upload_store
+from config import logger, OCR_IMAGE_EXTENSIONS
+from typing import Any, Dict, Iterator, Optional
 import os
+import threading
 
-def process_input_document(text_input: str, output_pdf_path: str, signature_path: Optional[str],
+def prepare_input_document(input_filepath: str) -> Optional[str]:
+    """
+    Make sure the input document has a text layer, running OCR if needed. Returns the usable path.
+
+    Uploads from the content-addressed store keep their OCR'd copy next to the
+    blob, so a document uploaded again is not OCR'd again.
+    """
+    # PyMuPDF is only needed when a document is attached
+    from src.pdf_utils import (OCRResult, image_only_pages, image_to_pdf_with_ocr, is_pdf_text_extractable,
+                               pdf_to_pdf_with_ocr)
+    store = get_upload_store()
+    digest = store.digest_of(input_filepath)
+    dir_name, base_name = os.path.split(input_filepath)
+    file_name, ext = os.path.splitext(base_name)
+    new_file_path = store.derived_path(digest, "_ocr.pdf") if digest else os.path.join(dir_name, f"{file_name}_ocr.pdf")
+    if digest and os.path.exists(new_file_path):
+        logger.info("Reusing OCR'd copy of %s", input_filepath)
+        os.utime(new_file_path)
+        return new_file_path
+    # Shared copies are written under a temporary name so concurrent requests never read a partial file
+    output_path = f"{new_file_path}.{os.getpid()}.{threading.get_ident()}.tmp" if digest else new_file_path
+
+    def publish(result: OCRResult) -> Optional[str]:
+        if not result:
+            return None
+        if result.failed_pages:
+            # Use the copy for this request only, so the missing pages are OCR'd again next time
+            return output_path
+        if output_path != new_file_path:
+            os.replace(output_path, new_file_path)
+        return new_file_path
+
+    if not input_filepath.lower().endswith('.pdf'):
+        return publish(image_to_pdf_with_ocr(output_pdf_path = output_path, input_filepath = input_filepath))
+    # The early-exit probe usually stops on the first page; only documents without a text layer get the page map
+    if is_pdf_text_extractable(input_filepath, digest=digest):
+        return input_filepath
+    pages_to_ocr = image_only_pages(input_filepath, digest)
+    logger.warning("PDF text is not extractable on %d page(s), preparing for OCR: %s",
+                   len(pages_to_ocr), input_filepath)
+    return publish(pdf_to_pdf_with_ocr(output_pdf_path = output_path, input_filepath = input_filepath,
+                                       pages = pages_to_ocr))
+
+def is_supported_document(input_filepath: str) -> bool:
+    """PDFs are read directly and images through OCR; other attachments are not used."""
+    ext = os.path.splitext(input_filepath)[1].lower().lstrip('.')
+    return ext == 'pdf' or ext in OCR_IMAGE_EXTENSIONS
+
+def compose_report_input(text_input: str, input_filepath: Optional[str]) -> Optional[str]:
+    """Combine the user's text with a map-reduced summary of the input document, if any."""
+    if not input_filepath:
+        return text_input
+    if not is_supported_document(input_filepath):
+        logger.warning("Ignoring attached document %s: only PDFs and images are supported", input_filepath)
+        return text_input
+    from src.document_ingest import summarize_document
+    input_filepath = prepare_input_document(input_filepath)
+    if not input_filepath:
+        return None
+    summary = summarize_document(input_filepath)
+    if not summary:
+        return text_input
+    return f"{text_input}\n\nSource document summary:\n{summary}"
+
+def build_report_content(text_input: str, input_filepath: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Run the LLM stage: produce the flat report dictionary, including its "Title" entry."""
+    report_input = compose_report_input(text_input, input_filepath)
+    if report_input is None:
+        return None
+    return create_structured_report(report_input)
+
+def stream_report_content(text_input: str, input_filepath: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Streaming counterpart of build_report_content: yield title and section events from the LLM stage."""
+    report_input = compose_report_input(text_input, input_filepath)
+    if report_input is None:
+        raise RuntimeError("Failed to prepare input document")
+    yield from stream_structured_report(report_input)
+
+def render_report(content: Dict[str, str], report_id: str, signature_path: Optional[str]) -> bool:
+    """Run the PDF stage: render a flat report dictionary in memory and put it in the report store under `report_id`."""
+    content = dict(content)
+    title = content.pop("Title", "Generated Report")
+    try:
+        pdf_bytes = render_report_bytes(content, title, signature_path)
+    except Exception as e:
+        logger.exception("Error rendering report %s: %s", report_id, e)
+        return False
+    get_pdf_store().put(report_id, pdf_bytes)
+    logger.info("Report %s stored (%d bytes)", report_id, len(pdf_bytes))
+    return True
+
+def process_input_document(text_input: str, report_id: str, signature_path: Optional[str],
                            input_filepath: Optional[str] = None) -> bool:
     """Process input text and an optional PDF file to generate a structured report PDF."""
     try:
-        if input_filepath:
-            if not input_filepath.lower().endswith('.pdf'):
-                
-                dir_name, base_name = os.path.split(input_filepath)
-                file_name, ext = os.path.splitext(base_name)
-                new_file_path = os.path.join(dir_name, f"{file_name}_ocr{ext}")
-
-                if image_to_pdf_with_ocr(output_pdf_path = new_file_path, input_filepath = input_filepath):
-                    input_filepath = new_file_path
-                else:
-                    return False
-            elif not is_pdf_text_extractable(input_filepath):
-                logger.warning("PDF text is not extractable, preparing for OCR: %s", input_filepath)
-                dir_name, base_name = os.path.split(input_filepath)
-                file_name, ext = os.path.splitext(base_name)
-                new_file_path = os.path.join(dir_name, f"{file_name}_ocr{ext}")
-
-                if pdf_to_pdf_with_ocr(output_pdf_path = new_file_path, input_filepath = input_filepath):
-                    input_filepath = new_file_path
-                else:
-                    return False
-            # result = edit_pdf_content(text_input, input_filepath, output_pdf_path)
-        else:
-            content_dict = create_structured_report(text_input)
-            title = content_dict.pop("Title", "Generated Report")
-            result = generate_report_from_dict(content=content_dict, filename=output_pdf_path, title=title, signature_image=signature_path)
-        return result
+        content_dict = build_report_content(text_input, input_filepath)
+        if content_dict is None:
+            return False
+        return render_report(content_dict, report_id, signature_path)
     except Exception as e:
         logger.exception("Failed to process input document: %s", e)
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,200 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import logger, JOB_STAGE_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL
+
+# A step runs on the worker pool of its stage and receives the previous step's result
+Step = Tuple[str, Callable[[Any], Any]]
+
+
+class QueueFullError(Exception):
+    """Raised when a stage queue has no room for another job."""
+
+
+class Job:
+    def __init__(self, steps: List[Step], on_finish: Optional[Callable[[], None]] = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.steps = steps
+        self.on_finish = on_finish
+        # Steps run with the submitting request's correlation id and trace
+        self.context = contextvars.copy_context()
+        self.step_index = 0
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+
+    @property
+    def stage(self) -> str:
+        return self.steps[min(self.step_index, len(self.steps) - 1)][0]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "result": self.result if self.status == "succeeded" else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs multi-step jobs on bounded per-stage worker pools.
+
+    Every stage (transcription, LLM generation, PDF rendering) has its own
+    queue and threads, so a slow LLM call never occupies a transcription
+    worker. Worker threads are started lazily in the process that first
+    submits a job, which keeps the manager safe to create before a fork.
+    """
+
+    def __init__(self, stage_workers: Dict[str, int] = JOB_STAGE_WORKERS, queue_size: int = JOB_QUEUE_SIZE,
+                 result_ttl: float = JOB_RESULT_TTL) -> None:
+        self.stage_workers = stage_workers
+        self.result_ttl = result_ttl
+        self._queues = {stage: queue.Queue(maxsize=queue_size) for stage in stage_workers}
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for stage, count in self.stage_workers.items():
+                for index in range(count):
+                    threading.Thread(target=self._work, args=(stage,), daemon=True,
+                                     name=f"job-{stage}-{index}").start()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def submit(self, steps: List[Step], on_finish: Optional[Callable[[], None]] = None, block: bool = False) -> Job:
+        """
+        Queue a job on the stage of its first step. Raises QueueFullError under backpressure,
+        or with `block` waits for room in the queue instead.
+
+        `on_finish` is called once the job has succeeded, failed or been cancelled.
+        """
+        self._ensure_workers()
+        self._purge_expired()
+        job = Job(steps, on_finish)
+        try:
+            self._queues[job.stage].put(job, block=block)
+        except queue.Full:
+            raise QueueFullError(f"The {job.stage} queue is full")
+        with self._lock:
+            self._jobs[job.id] = job
+        logger.info("Queued job %s on stage %s", job.id, job.stage)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. A running step finishes, but its result is discarded."""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with self._lock:
+            if job.finished:
+                return False
+            job.cancel_requested = True
+            queued = job.status == "queued"
+        if queued:
+            self._finish(job, "cancelled")
+        return True
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {stage: stage_queue.qsize() for stage, stage_queue in self._queues.items()}
+
+    def is_full(self, stage: str) -> bool:
+        return self._queues[stage].full()
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        # Status changes happen under the lock so a concurrent cancel() is never overwritten
+        with self._lock:
+            if job.finished:
+                return
+            if job.cancel_requested and status == "succeeded":
+                status, result = "cancelled", None
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+        job.context.run(logger.info, "Job %s %s", job.id, status)
+        if job.on_finish:
+            try:
+                job.on_finish()
+            except Exception as e:
+                logger.exception("on_finish callback of job %s failed: %s", job.id, e)
+
+    def _work(self, stage: str) -> None:
+        stage_queue = self._queues[stage]
+        while True:
+            job = stage_queue.get()
+            try:
+                self._run_step(job)
+            finally:
+                stage_queue.task_done()
+
+    def _run_step(self, job: Job) -> None:
+        with self._lock:
+            if not job.cancel_requested:
+                job.status = "running"
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+            return
+        _, step = job.steps[job.step_index]
+        try:
+            result = job.context.run(step, job.result)
+        except Exception as e:
+            logger.exception("Job %s failed on stage %s: %s", job.id, job.stage, e)
+            self._finish(job, "failed", error=str(e))
+            return
+        job.step_index += 1
+        if job.step_index == len(job.steps):
+            self._finish(job, "succeeded", result=result)
+            return
+        with self._lock:
+            if not job.cancel_requested:
+                job.result = result
+                job.status = "queued"
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+            return
+        # Blocking put: a full downstream stage slows this stage down instead of dropping work
+        self._queues[job.stage].put(job)
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,254 @@
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+import ffmpeg
+import numpy as np
+from config import (logger, AUDIO_SAMPLE_RATE, AUDIO_READ_CHUNK_SIZE, LIVE_WINDOW_SECONDS, LIVE_SEARCH_SECONDS,
+                    LIVE_MAX_SESSIONS, LIVE_SESSION_TIMEOUT, LIVE_MAX_BACKLOG_SECONDS)
+from src.audio_utils import iter_transcript_segments
+from src.long_audio import split_on_silence
+from src.whisper_scheduler import AUTO_OPTION, get_whisper_scheduler
+
+BYTES_PER_SAMPLE = 2
+
+
+class SessionLimitError(Exception):
+    """Raised when LIVE_MAX_SESSIONS recordings are already in progress."""
+
+
+class LiveSession:
+    """
+    One recording transcribed while it is being made.
+
+    Chunks of the browser's MediaRecorder stream are written to a persistent
+    ffmpeg process; a reader thread appends the decoded 16 kHz PCM to a buffer
+    and a transcription thread takes a window off its front whenever more than
+    `window_seconds` are waiting. Transcribed audio is dropped from the buffer.
+    When transcription is slower than real time the buffer grows, so a session
+    with more than `max_backlog_seconds` of untranscribed audio fails and the
+    client falls back to a full upload. finish() transcribes whatever is left
+    once the input is closed.
+    """
+
+    def __init__(self, model_option: int, window_seconds: float = LIVE_WINDOW_SECONDS,
+                 search_seconds: float = LIVE_SEARCH_SECONDS,
+                 max_backlog_seconds: float = LIVE_MAX_BACKLOG_SECONDS) -> None:
+        self.id = uuid.uuid4().hex
+        self.model_option = model_option
+        self.window_seconds = window_seconds
+        self.search_seconds = search_seconds
+        self.max_backlog_seconds = max(max_backlog_seconds, window_seconds)
+        self.last_active = time.monotonic()
+        self.finishing = False
+        self.error: Optional[str] = None
+        self._pcm = bytearray()
+        self._offset_samples = 0  # Samples already transcribed and dropped from _pcm
+        self._segments: List[Dict[str, Any]] = []
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr: List[bytes] = []
+        self._stderr_thread: Optional[threading.Thread] = None
+        self._eof = False
+        self._cancelled = False
+        self._done = threading.Event()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+    def _start_decoder(self) -> subprocess.Popen:
+        return (
+            ffmpeg
+            .input('pipe:0')
+            .output('pipe:1', format='s16le', acodec='pcm_s16le', ac=1, ar=AUDIO_SAMPLE_RATE)
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        )
+
+    def _start(self) -> None:
+        self._process = self._start_decoder()
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        threading.Thread(target=self._read_pcm, name=f"live-{self.id[:8]}-reader", daemon=True).start()
+        threading.Thread(target=self._transcribe_windows, name=f"live-{self.id[:8]}-transcriber", daemon=True).start()
+
+    def _read_pcm(self) -> None:
+        max_bytes = int(self.max_backlog_seconds * AUDIO_SAMPLE_RATE) * BYTES_PER_SAMPLE
+        while True:
+            data = self._process.stdout.read1(AUDIO_READ_CHUNK_SIZE)
+            if not data:
+                break
+            with self._cond:
+                self._pcm.extend(data)
+                self._cond.notify_all()
+                overflow = len(self._pcm) > max_bytes
+            if overflow:
+                logger.warning("Live session %s is more than %.0fs behind the recording, stopping it",
+                               self.id, self.max_backlog_seconds)
+                with self._cond:
+                    self.error = "Transcription cannot keep up with the recording"
+                self.close()
+                break
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        with self._cond:
+            if returncode != 0 and not self._cancelled:
+                stderr = b"".join(self._stderr).decode(errors="replace").strip()
+                self.error = f"Decoding failed: {stderr or f'ffmpeg exited with {returncode}'}"
+            self._eof = True
+            self._cond.notify_all()
+
+    def _drain_stderr(self) -> None:
+        self._stderr.append(self._process.stderr.read())
+
+    @property
+    def seconds_decoded(self) -> float:
+        with self._cond:
+            return (self._offset_samples + len(self._pcm) // BYTES_PER_SAMPLE) / AUDIO_SAMPLE_RATE
+
+    def feed(self, data: bytes) -> None:
+        """Append the next chunk of the recording. Raises RuntimeError once the session has failed."""
+        self.last_active = time.monotonic()
+        with self._write_lock:
+            if self.error:
+                raise RuntimeError(self.error)
+            if self.finishing or self._cancelled:
+                raise RuntimeError("Recording session is closed")
+            if self._process is None:
+                self._start()
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Decoding failed: {self.error or 'ffmpeg exited'}")
+            try:
+                self._process.stdin.write(data)
+                self._process.stdin.flush()
+            except BrokenPipeError:
+                raise RuntimeError(self.error or "Decoding failed: ffmpeg exited")
+
+    def _next_window(self) -> Optional[tuple]:
+        """Wait for a window to transcribe and take it off the buffer. Returns (pcm, offset seconds) or None when done."""
+        window = int(self.window_seconds * AUDIO_SAMPLE_RATE)
+        with self._cond:
+            while not (self._cancelled or self._eof or len(self._pcm) // BYTES_PER_SAMPLE > window):
+                self._cond.wait()
+            if self._cancelled:
+                return None
+            available = len(self._pcm) // BYTES_PER_SAMPLE
+            pcm = np.frombuffer(bytes(self._pcm[:available * BYTES_PER_SAMPLE]), dtype=np.int16)
+            if available > window:
+                # Cut between words: at the quietest frame of the window's last search_seconds
+                _, cut = split_on_silence(pcm.astype(np.float32), chunk_seconds=self.window_seconds,
+                                          overlap_seconds=0.0, search_seconds=self.search_seconds)[0]
+            elif available:
+                cut = available
+            else:
+                return None
+            offset = self._offset_samples / AUDIO_SAMPLE_RATE
+            del self._pcm[:cut * BYTES_PER_SAMPLE]
+            self._offset_samples += cut
+        return pcm[:cut].astype(np.float32) / 32768.0, offset
+
+    def _transcribe_windows(self) -> None:
+        try:
+            while True:
+                window = self._next_window()
+                if window is None:
+                    return
+                pcm, offset = window
+                option = self.model_option
+                if option == AUTO_OPTION:
+                    # Nothing to refine later in a live transcript, so no speculation
+                    option = get_whisper_scheduler().choose(len(pcm) / AUDIO_SAMPLE_RATE, speculative=False).option
+                for segment in iter_transcript_segments(pcm, option):
+                    segment = dict(segment, start=round(segment["start"] + offset, 2),
+                                   end=round(segment["end"] + offset, 2))
+                    with self._cond:
+                        self._segments.append(segment)
+                logger.debug("Live session %s transcribed up to %.1fs", self.id, offset + len(pcm) / AUDIO_SAMPLE_RATE)
+        except Exception as e:
+            logger.exception("Live transcription of session %s failed: %s", self.id, e)
+            with self._cond:
+                self.error = str(e)
+        finally:
+            self._done.set()
+
+    def segments_since(self, index: int = 0) -> List[Dict[str, Any]]:
+        with self._cond:
+            return self._segments[max(0, index):]
+
+    def finish(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Close the input, wait until the rest is transcribed and return all segments. Raises RuntimeError on failure."""
+        with self._write_lock:
+            self.finishing = True
+            if self._process is None:
+                return []
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for the transcription to finish")
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.segments_since(0)
+
+    def close(self) -> None:
+        """Stop decoding and transcribing; a window being transcribed finishes in the background."""
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+
+
+class LiveSessionManager:
+    """Recording sessions of this process; sessions idle for `idle_timeout` seconds are dropped."""
+
+    def __init__(self, max_sessions: int = LIVE_MAX_SESSIONS, idle_timeout: float = LIVE_SESSION_TIMEOUT) -> None:
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, LiveSession] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [session for session in self._sessions.values()
+                       if not session.finishing and session.last_active < cutoff]
+            for session in expired:
+                del self._sessions[session.id]
+        for session in expired:
+            logger.warning("Dropping live session %s after %ds without audio", session.id, self.idle_timeout)
+            session.close()
+
+    def start(self, model_option: int) -> LiveSession:
+        self._expire()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionLimitError(f"{self.max_sessions} recordings are already in progress")
+            session = LiveSession(model_option)
+            self._sessions[session.id] = session
+        logger.info("Started live session %s", session.id)
+        return session
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        self._expire()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+
+_manager: Optional[LiveSessionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_live_session_manager() -> LiveSessionManager:
+    """Return the process-wide live session manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = LiveSessionManager()
+        return _manager
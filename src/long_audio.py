@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import (logger, AUDIO_SAMPLE_RATE, LONG_AUDIO_CHUNK_SECONDS, LONG_AUDIO_OVERLAP_SECONDS,
+                    LONG_AUDIO_SEARCH_SECONDS, LONG_AUDIO_THREADS_PER_WORKER, LONG_AUDIO_WORKERS)
+from src.model_registry import get_model_registry
+
+FRAME_SECONDS = 0.02
+
+# One pool per model; the models its workers load are reserved in the Whisper registry's memory budget
+_executors: Dict[str, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+# Attempts to submit a file's chunks when a pool turns out to be broken or shut down
+_SUBMIT_ATTEMPTS = 3
+_worker_model: Any = None
+
+
+def _frame_energy(pcm: np.ndarray) -> np.ndarray:
+    """Return the RMS energy of consecutive FRAME_SECONDS frames."""
+    frame = int(AUDIO_SAMPLE_RATE * FRAME_SECONDS)
+    usable = len(pcm) - len(pcm) % frame
+    frames = pcm[:usable].reshape(-1, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def split_on_silence(pcm: np.ndarray, chunk_seconds: float = LONG_AUDIO_CHUNK_SECONDS,
+                     overlap_seconds: float = LONG_AUDIO_OVERLAP_SECONDS,
+                     search_seconds: float = LONG_AUDIO_SEARCH_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Split PCM samples into overlapping (start, end) sample ranges.
+
+    Each chunk ends at the quietest frame within `search_seconds` before its
+    nominal end, so cuts fall between words rather than through them. The
+    next chunk starts `overlap_seconds` before that cut.
+    """
+    total = len(pcm)
+    chunk = int(chunk_seconds * AUDIO_SAMPLE_RATE)
+    if total <= chunk:
+        return [(0, total)]
+    frame = int(AUDIO_SAMPLE_RATE * FRAME_SECONDS)
+    overlap = int(overlap_seconds * AUDIO_SAMPLE_RATE)
+    search = int(search_seconds * AUDIO_SAMPLE_RATE)
+    energy = _frame_energy(pcm)
+
+    boundaries = []
+    start = 0
+    while start + chunk < total:
+        nominal_end = start + chunk
+        lo = max(start + overlap + frame, nominal_end - search) // frame
+        hi = nominal_end // frame
+        end = (lo + int(np.argmin(energy[lo:hi]))) * frame if hi > lo else nominal_end
+        boundaries.append((start, end))
+        start = end - overlap
+    boundaries.append((start, total))
+    return boundaries
+
+
+def _init_worker(model_name: str, n_threads: int) -> None:
+    global _worker_model
+    from pywhispercpp.model import Model
+
+    _worker_model = Model(model_name, n_threads=n_threads)
+
+
+def _transcribe_chunk(samples: np.ndarray) -> List[Tuple[float, float, str]]:
+    """Transcribe one chunk in a pool worker; times are in seconds relative to the chunk."""
+    segments = _worker_model.transcribe(samples)
+    # pywhispercpp reports segment times in 10 ms units
+    return [(segment.t0 / 100.0, segment.t1 / 100.0, segment.text) for segment in segments]
+
+
+def _memory_owner(model_name: str) -> str:
+    return f"long_audio:{model_name}"
+
+
+def _get_executor(model_name: str) -> ProcessPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(model_name)
+        if executor is None:
+            workers = get_model_registry().reserve_memory(_memory_owner(model_name), model_name, LONG_AUDIO_WORKERS)
+            if workers < LONG_AUDIO_WORKERS:
+                logger.info("Long-audio pool for %s limited to %d workers by the Whisper memory budget",
+                            model_name, workers)
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(model_name, LONG_AUDIO_THREADS_PER_WORKER),
+            )
+            _executors[model_name] = executor
+        return executor
+
+
+def _discard_executor(model_name: str, executor: ProcessPoolExecutor) -> None:
+    """Forget a broken pool, e.g. after a worker crashed or failed to load the model; the next call starts a new one."""
+    with _executors_lock:
+        if _executors.get(model_name) is executor:
+            del _executors[model_name]
+            get_model_registry().release_memory(_memory_owner(model_name))
+    # Chunks other requests already submitted still finish, or fail with BrokenProcessPool if the pool broke
+    executor.shutdown(wait=False)
+
+
+def _submit_chunks(pcm: np.ndarray, model_name: str,
+                   boundaries: List[Tuple[int, int]]) -> Tuple[ProcessPoolExecutor, List[Future]]:
+    """
+    Submit every chunk to the model's pool. A pool that another request found broken and shut down
+    rejects new work, so the chunks are resubmitted to a fresh pool instead of failing the request.
+    """
+    for attempt in range(1, _SUBMIT_ATTEMPTS + 1):
+        executor = _get_executor(model_name)
+        futures: List[Future] = []
+        try:
+            for start, end in boundaries:
+                futures.append(executor.submit(_transcribe_chunk, pcm[start:end]))
+            return executor, futures
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: "cannot schedule new futures after shutdown"
+            for future in futures:
+                future.cancel()
+            _discard_executor(model_name, executor)
+            if attempt == _SUBMIT_ATTEMPTS:
+                raise
+            logger.warning("Long-audio pool for %s is unusable (%s), retrying with a new one", model_name, e)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def transcribe_long_audio(pcm: np.ndarray, model_name: str,
+                          boundaries: Optional[List[Tuple[int, int]]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Transcribe long PCM audio chunk-parallel and yield stitched segments in order.
+
+    All chunks are submitted to the process pool at once; segments are yielded
+    as soon as every earlier chunk has finished. Within an overlap, a segment
+    belongs to the chunk on whose side of the overlap midpoint its centre lies.
+    A segment in an overlap that repeats the previous segment's text and
+    overlaps it in time was transcribed twice and is dropped.
+    """
+    if boundaries is None:
+        boundaries = split_on_silence(pcm)
+    executor, futures = _submit_chunks(pcm, model_name, boundaries)
+    try:
+        logger.info("Transcribing %.1fs of audio in %d chunks with %s",
+                    len(pcm) / AUDIO_SAMPLE_RATE, len(boundaries), model_name)
+
+        previous: Optional[Tuple[float, str]] = None  # End time and normalized text of the last segment
+        for index, ((start, end), future) in enumerate(zip(boundaries, futures)):
+            keep_from = (start + boundaries[index - 1][1]) / 2 if index > 0 else 0
+            keep_until = (boundaries[index + 1][0] + end) / 2 if index + 1 < len(boundaries) else float("inf")
+            overlap_end = boundaries[index - 1][1] / AUDIO_SAMPLE_RATE if index > 0 else 0.0
+            offset = start / AUDIO_SAMPLE_RATE
+            for t0, t1, text in future.result():
+                centre = (offset + (t0 + t1) / 2) * AUDIO_SAMPLE_RATE
+                if not keep_from <= centre < keep_until or not text.strip():
+                    continue
+                seg_start, seg_end, normalized = offset + t0, offset + t1, _normalize(text)
+                if (previous and seg_start < overlap_end and seg_start < previous[0]
+                        and normalized == previous[1]):
+                    continue
+                previous = (seg_end, normalized)
+                yield {"start": round(seg_start, 2), "end": round(seg_end, 2), "text": text}
+    except BrokenProcessPool:
+        logger.error("Long-audio worker pool for %s broke, it will be restarted", model_name)
+        _discard_executor(model_name, executor)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
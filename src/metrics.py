@@ -0,0 +1,182 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached lookup up to a long transcription or report
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """A gauge that is either set directly or read from a callback at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """Read the values from `callback`, which returns {label values tuple: value}, on every scrape."""
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback:
+            values.update(self._callback())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: [per-bucket counts..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(counts[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process registry rendered in the Prometheus text exposition format.
+
+    Values are per process: behind the pre-fork server each scrape of /metrics
+    is answered by one worker, which reports its own counts.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "reportease_http_request_duration_seconds", "Time from request start until the response was fully sent.",
+    ("endpoint", "method", "status")))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "reportease_stage_duration_seconds", "Time spent in one pipeline stage.", ("stage",)))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "reportease_job_queue_depth", "Jobs waiting in each background job stage queue.", ("stage",)))
+MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "reportease_model_load_duration_seconds", "Time to load one Whisper model instance.", ("model",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "reportease_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "reportease_llm_tokens_total", "Tokens processed by the LLM, by kind (prompt or completion).", ("kind",)))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "reportease_llm_tokens_per_second", "LLM generation speed per call, as reported by Ollama.", (),
+    buckets=(1, 2.5, 5, 10, 20, 40, 80, 160)))
+
+WHISPER_DECISIONS = REGISTRY.register(Counter(
+    "reportease_whisper_decisions_total", "Automatic Whisper model choices by model and mode.", ("model", "mode")))
+WHISPER_REAL_TIME_FACTOR = REGISTRY.register(Gauge(
+    "reportease_whisper_real_time_factor", "Smoothed seconds of processing per second of audio, per model.",
+    ("model",)))
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
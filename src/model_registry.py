@@ -0,0 +1,206 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from config import (logger, WHISPER_POOL_SIZE, WHISPER_THREADS_PER_MODEL,
+                    WHISPER_MEMORY_BUDGET_MB, WHISPER_MODEL_MEMORY_MB)
+from src.metrics import MODEL_LOAD_SECONDS, record_cache_lookup
+
+
+class _ModelPool:
+    """Loaded instances of a single Whisper model plus their bookkeeping."""
+
+    def __init__(self, model_name: str, size: int) -> None:
+        self.model_name = model_name
+        self.size = size
+        self.idle: List[Any] = []
+        self.loaded = 0  # Instances that exist or are being loaded
+        self.last_used = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_count = 0
+        self.load_seconds = 0.0
+
+
+class WhisperModelRegistry:
+    """
+    Process-wide registry of warm pywhispercpp models.
+
+    Each model name gets a small pool of instances so that concurrent requests
+    never share one whisper context. Idle instances of the least recently used
+    models are evicted when loading another one would exceed the memory budget.
+    Models loaded outside this process (the long-audio workers) are counted in
+    the budget through reserve_memory().
+    """
+
+    def __init__(self, pool_size: int = WHISPER_POOL_SIZE, n_threads: int = WHISPER_THREADS_PER_MODEL,
+                 memory_budget_mb: int = WHISPER_MEMORY_BUDGET_MB) -> None:
+        self.pool_size = pool_size
+        self.n_threads = n_threads
+        self.memory_budget_mb = memory_budget_mb
+        self._pools: Dict[str, _ModelPool] = {}
+        self._reserved_mb: Dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _model_memory_mb(model_name: str) -> int:
+        return WHISPER_MODEL_MEMORY_MB.get(model_name, 0)
+
+    def _pool(self, model_name: str) -> _ModelPool:
+        pool = self._pools.get(model_name)
+        if pool is None:
+            pool = self._pools[model_name] = _ModelPool(model_name, self.pool_size)
+        return pool
+
+    def _used_memory_mb(self) -> int:
+        loaded = sum(pool.loaded * self._model_memory_mb(name) for name, pool in self._pools.items())
+        return loaded + sum(self._reserved_mb.values())
+
+    def _evict_idle(self, needed_mb: int, keep: Optional[str] = None) -> bool:
+        """
+        Drop idle instances of models other than `keep`, least recently used first, until `needed_mb` more
+        fits the budget. Returns False if it does not. Caller holds the lock.
+        """
+        while self._used_memory_mb() + needed_mb > self.memory_budget_mb:
+            candidates = [pool for name, pool in self._pools.items() if name != keep and pool.idle]
+            if not candidates:
+                return False
+            victim = min(candidates, key=lambda pool: pool.last_used)
+            victim.idle.pop()
+            victim.loaded -= 1
+            victim.evictions += 1
+            logger.info("Evicted idle Whisper model %s to stay within %d MB",
+                        victim.model_name, self.memory_budget_mb)
+        return True
+
+    def _evict_for(self, model_name: str) -> None:
+        """Drop idle instances of other models until `model_name` fits the budget. Caller holds the lock."""
+        if not self._evict_idle(self._model_memory_mb(model_name), keep=model_name):
+            logger.warning("Whisper memory budget of %d MB exceeded while loading %s",
+                           self.memory_budget_mb, model_name)
+
+    def reserve_memory(self, owner: str, model_name: str, max_instances: int) -> int:
+        """
+        Count up to `max_instances` copies of a model loaded by `owner` outside the registry in the budget,
+        evicting idle instances to make room. Replaces the owner's previous reservation and returns how
+        many instances fit, at least one.
+        """
+        needed = self._model_memory_mb(model_name)
+        with self._cond:
+            self._reserved_mb.pop(owner, None)
+            instances = max_instances
+            if needed:
+                self._evict_idle(needed * max_instances)
+                free = self.memory_budget_mb - self._used_memory_mb()
+                instances = max(1, min(max_instances, free // needed))
+                if needed * instances > free:
+                    logger.warning("Whisper memory budget of %d MB exceeded by %s", self.memory_budget_mb, owner)
+            self._reserved_mb[owner] = needed * instances
+        return instances
+
+    def release_memory(self, owner: str) -> None:
+        with self._cond:
+            self._reserved_mb.pop(owner, None)
+
+    def _load(self, model_name: str) -> Any:
+        from pywhispercpp.model import Model
+
+        start = time.perf_counter()
+        instance = Model(model_name, n_threads=self.n_threads)
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            pool = self._pool(model_name)
+            pool.load_count += 1
+            pool.load_seconds += elapsed
+        MODEL_LOAD_SECONDS.observe(elapsed, model=model_name)
+        logger.info("Loaded Whisper model %s in %.2fs", model_name, elapsed)
+        return instance
+
+    def _checkout(self, model_name: str) -> Any:
+        with self._cond:
+            pool = self._pool(model_name)
+            while True:
+                if pool.idle:
+                    pool.hits += 1
+                    record_cache_lookup("whisper_pool", hit=True)
+                    pool.last_used = time.monotonic()
+                    return pool.idle.pop()
+                if pool.loaded < pool.size:
+                    pool.misses += 1
+                    record_cache_lookup("whisper_pool", hit=False)
+                    self._evict_for(model_name)
+                    pool.loaded += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._load(model_name)
+        except Exception:
+            with self._cond:
+                pool.loaded -= 1
+                self._cond.notify_all()
+            raise
+
+    def _checkin(self, model_name: str, instance: Any) -> None:
+        with self._cond:
+            pool = self._pool(model_name)
+            pool.idle.append(instance)
+            pool.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, model_name: str) -> Iterator[Any]:
+        """Borrow a loaded model instance for the duration of the block."""
+        instance = self._checkout(model_name)
+        try:
+            yield instance
+        finally:
+            self._checkin(model_name, instance)
+
+    def preload(self, model_names: List[str]) -> None:
+        """Load one instance of each model up front so the first request is warm."""
+        for model_name in model_names:
+            with self._cond:
+                pool = self._pool(model_name)
+                if pool.loaded:
+                    continue
+                self._evict_for(model_name)
+                pool.loaded += 1
+            try:
+                instance = self._load(model_name)
+            except Exception as e:
+                with self._cond:
+                    pool.loaded -= 1
+                logger.exception("Failed to preload Whisper model %s: %s", model_name, e)
+                continue
+            self._checkin(model_name, instance)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return hit/miss, eviction and load-time counters per model."""
+        with self._cond:
+            return {
+                name: {
+                    "loaded": pool.loaded,
+                    "idle": len(pool.idle),
+                    "hits": pool.hits,
+                    "misses": pool.misses,
+                    "evictions": pool.evictions,
+                    "load_count": pool.load_count,
+                    "load_seconds_total": round(pool.load_seconds, 3),
+                    "load_seconds_avg": round(pool.load_seconds / pool.load_count, 3) if pool.load_count else None,
+                }
+                for name, pool in self._pools.items()
+            }
+
+
+_registry: Optional[WhisperModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> WhisperModelRegistry:
+    """Return the process-wide Whisper model registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = WhisperModelRegistry()
+        return _registry
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+import fitz
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Optional
+from config import (logger, OCR_DPI, OCR_LANGUAGE, OCR_TESSDATA, OCR_WORKERS, OCR_CACHE_FOLDER,
+                    OCR_CACHE_MAX_BYTES)
+from src.cache import DiskCache, make_cache_key
+from src.tracing import traced
+from src.upload_store import file_digest
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> DiskCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(OCR_CACHE_FOLDER, max_bytes=OCR_CACHE_MAX_BYTES)
+        return _cache
+
+
+def _init_worker() -> None:
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(file_path: str, page_index: int) -> bytes:
+    """Rasterize one page and return it as a single-page PDF with an invisible text layer. Runs in a pool worker."""
+    with fitz.open(file_path) as doc:
+        pix = doc[page_index].get_pixmap(dpi=OCR_DPI)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    return pix.pdfocr_tobytes(compress=True, language=OCR_LANGUAGE, tessdata=OCR_TESSDATA)
+
+
+def _page_cache_key(doc: fitz.Document, page_index: int, file_path: str) -> str:
+    """
+    Cache key of a page's OCR result, computed in the parent without rendering the page.
+
+    A PDF page is keyed by its content stream and the raw data of its images,
+    so the same scan uploaded again, alone or inside another document, is never
+    re-recognized. Image files are keyed by their content hash.
+    """
+    if not doc.is_pdf:
+        return make_cache_key(file_digest(file_path), page_index, OCR_DPI, OCR_LANGUAGE)
+    page = doc[page_index]
+    content = hashlib.sha256()
+    for xref in page.get_contents():
+        content.update(doc.xref_stream_raw(xref) or b"")
+    for xref in sorted({image[0] for image in page.get_images(full=True)}):
+        content.update(doc.xref_stream_raw(xref) or b"")
+    return make_cache_key(content.hexdigest(), tuple(page.rect), page.rotation, OCR_DPI, OCR_LANGUAGE)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_worker)
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died (Tesseract crash, OOM kill); the next call starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    logger.error("OCR worker pool broke, it will be restarted")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+@traced("ocr")
+def ocr_document(input_filepath: str, output_pdf_path: str, pages: Optional[Iterable[int]] = None) -> int:
+    """
+    Write a searchable copy of a PDF or image to `output_pdf_path`.
+
+    Every page listed in `pages` (all pages by default) is OCR'd in the process
+    pool, one page per task; the remaining pages are copied unchanged. A page
+    whose OCR fails is copied unchanged as well, so one bad page does not lose
+    the rest of the document. Returns the number of such pages.
+    """
+    with fitz.open(input_filepath) as src:
+        # Images open as documents too, but only PDFs can be copied page by page
+        pdf_src = src if src.is_pdf else fitz.open("pdf", src.convert_to_pdf())
+        targets = sorted(set(range(src.page_count) if pages is None else pages))
+        cache = _get_cache()
+        keys = {index: _page_cache_key(src, index, input_filepath) for index in targets}
+        results: Dict[int, bytes] = {}
+        for index in targets:
+            cached = cache.get(keys[index])
+            if cached is not None:
+                results[index] = cached
+        executor = _get_executor()
+        futures: Dict[int, Future] = {}
+        try:
+            for index in targets:
+                if index not in results:
+                    futures[index] = executor.submit(_ocr_page, input_filepath, index)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+        logger.info("Running OCR on %d of %d pages of '%s' (%d cached)", len(targets) - len(results),
+                    src.page_count, input_filepath, len(results))
+        failed = 0
+        with fitz.open() as out:
+            for index in range(src.page_count):
+                page_pdf = results.get(index)
+                if page_pdf is None and index in keys:
+                    try:
+                        if index not in futures:
+                            raise BrokenProcessPool("OCR worker pool is not available")
+                        page_pdf = futures[index].result()
+                        cache.set(keys[index], page_pdf)
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            _discard_executor(executor)
+                        failed += 1
+                        logger.warning("OCR of page %d of '%s' failed, keeping it without text: %s",
+                                       index + 1, input_filepath, e)
+                if page_pdf is not None:
+                    with fitz.open("pdf", page_pdf) as page_doc:
+                        out.insert_pdf(page_doc)
+                else:
+                    out.insert_pdf(pdf_src, from_page=index, to_page=index)
+            out.save(output_pdf_path, garbage=3, deflate=True)
+        if pdf_src is not src:
+            pdf_src.close()
+    logger.info("Searchable PDF saved to '%s', OCR failed on %d of %d pages", output_pdf_path, failed, len(targets))
+    return failed
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import (logger, REPORT_FOLDER, PDF_STORE_MEMORY_MAX_BYTES, PDF_STORE_DISK_MAX_BYTES, PDF_STORE_TTL,
+                    PDF_STORE_WRITE_THROUGH, PDF_STORE_EXPIRE_INTERVAL)
+
+
+class StoredPDF:
+    """A generated report held either as bytes (memory tier) or as a file path (disk tier)."""
+
+    def __init__(self, report_id: str, etag: str, size: int, created: float, data: Optional[bytes] = None,
+                 path: Optional[str] = None) -> None:
+        self.report_id = report_id
+        self.etag = etag
+        self.size = size
+        self.created = created
+        self.data = data
+        self.path = path
+
+
+class PDFStore:
+    """
+    Two-tier store of generated reports, keyed by report id.
+
+    New reports are kept in memory; when the memory tier is full the least
+    recently read are spilled to files in `folder`. Both tiers drop reports
+    older than `ttl` seconds, and the disk tier evicts oldest-first when over
+    its size limit. The disk index is rebuilt from file mtimes on first use,
+    so it survives restarts, and reports written by other processes are
+    picked up on lookup.
+    """
+
+    def __init__(self, folder: str, memory_max_bytes: int, disk_max_bytes: int, ttl: float,
+                 write_through: bool = False, expire_interval: float = PDF_STORE_EXPIRE_INTERVAL) -> None:
+        self.folder = folder
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.write_through = write_through
+        self.expire_interval = expire_interval
+        self._last_expiry = 0.0
+        self._memory: "OrderedDict[str, StoredPDF]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional["OrderedDict[str, StoredPDF]"] = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.folder, report_id)
+
+    def _load_disk_index(self) -> "OrderedDict[str, StoredPDF]":
+        """Scan the report folder once, oldest first. ETags are computed lazily. Caller holds the lock."""
+        if self._disk is None:
+            entries = []
+            if os.path.isdir(self.folder):
+                for name in os.listdir(self.folder):
+                    if name.endswith(".tmp"):
+                        continue
+                    stat = os.stat(self._path(name))
+                    entries.append((stat.st_mtime, name, stat.st_size))
+            entries.sort()
+            self._disk = OrderedDict(
+                (name, StoredPDF(name, None, size, mtime, path=self._path(name))) for mtime, name, size in entries
+            )
+            self._disk_bytes = sum(size for _, _, size in entries)
+        return self._disk
+
+    def _write_file(self, entry: StoredPDF, data: bytes) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(entry.report_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        os.utime(path, (entry.created, entry.created))
+        disk = self._load_disk_index()
+        self._drop_disk_entry(entry.report_id, remove_file=False)
+        # Read the mtime back so get() can tell this file from one replaced by another process
+        disk[entry.report_id] = StoredPDF(entry.report_id, entry.etag, entry.size, os.stat(path).st_mtime, path=path)
+        self._disk_bytes += entry.size
+
+    def _drop_disk_entry(self, report_id: str, remove_file: bool = True) -> None:
+        entry = self._disk.pop(report_id, None)
+        if entry is not None:
+            self._disk_bytes -= entry.size
+        if remove_file:
+            try:
+                os.remove(self._path(report_id))
+            except FileNotFoundError:
+                pass
+
+    def _expire(self) -> None:
+        """Drop reports older than the TTL from both tiers. Caller holds the lock."""
+        disk = self._load_disk_index()
+        now = time.time()
+        cutoff = now - self.ttl
+        # Neither tier is ordered by age (reads reorder memory, lookups append older files to disk)
+        for report_id in [report_id for report_id, entry in self._memory.items() if entry.created < cutoff]:
+            self._memory_bytes -= self._memory.pop(report_id).size
+        for report_id in [report_id for report_id, entry in disk.items() if entry.created < cutoff]:
+            self._drop_disk_entry(report_id)
+        self._last_expiry = now
+
+    def _evict(self) -> None:
+        """Expire old reports, spill the memory tier to disk, then trim the disk tier. Caller holds the lock."""
+        self._expire()
+        disk = self._disk
+        while self._memory_bytes > self.memory_max_bytes:
+            _, entry = self._memory.popitem(last=False)
+            self._memory_bytes -= entry.size
+            if entry.report_id not in disk:
+                self._write_file(entry, entry.data)
+        while self._disk_bytes > self.disk_max_bytes and disk:
+            report_id = next(iter(disk))
+            logger.info("Evicting report %s from disk", report_id)
+            self._drop_disk_entry(report_id)
+
+    def put(self, report_id: str, data: bytes) -> StoredPDF:
+        entry = StoredPDF(report_id, hashlib.sha256(data).hexdigest(), len(data), time.time(), data=data)
+        with self._lock:
+            self._load_disk_index()
+            if self.write_through or entry.size > self.memory_max_bytes:
+                self._write_file(entry, data)
+            if entry.size <= self.memory_max_bytes:
+                self._memory[report_id] = entry
+                self._memory_bytes += entry.size
+            self._evict()
+        return entry
+
+    def get(self, report_id: str) -> Optional[StoredPDF]:
+        """Return the report from the memory tier, else from disk, or None if it is unknown or expired."""
+        with self._lock:
+            disk = self._load_disk_index()
+            now = time.time()
+            # A full sweep walks both tiers, so lookups run it at most every expire_interval and
+            # otherwise only check the requested report
+            if now - self._last_expiry >= self.expire_interval:
+                self._expire()
+            cutoff = now - self.ttl
+            entry = self._memory.get(report_id)
+            if entry is not None:
+                if entry.created >= cutoff:
+                    self._memory.move_to_end(report_id)
+                    return entry
+                self._memory_bytes -= self._memory.pop(report_id).size
+            entry = disk.get(report_id)
+            if entry is not None and entry.created < cutoff:
+                self._drop_disk_entry(report_id)
+                return None
+            path = self._path(report_id)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Another process may have evicted it
+                if entry is not None:
+                    self._drop_disk_entry(report_id, remove_file=False)
+                return None
+            if entry is None or entry.created != stat.st_mtime:
+                # Written or replaced by another process since the index was built
+                if stat.st_mtime < time.time() - self.ttl:
+                    return None
+                if entry is not None:
+                    self._drop_disk_entry(report_id, remove_file=False)
+                entry = disk[report_id] = StoredPDF(report_id, None, stat.st_size, stat.st_mtime, path=path)
+                self._disk_bytes += entry.size
+            if entry.etag is None:
+                with open(path, "rb") as f:
+                    entry.etag = hashlib.file_digest(f, "sha256").hexdigest()
+            return entry
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk = self._load_disk_index()
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_store: Optional[PDFStore] = None
+_store_lock = threading.Lock()
+
+def get_pdf_store() -> PDFStore:
+    """Return the process-wide report store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            # Read when the store is created, after the server has set up the worker's environment
+            write_through = PDF_STORE_WRITE_THROUGH or os.environ.get("PDF_STORE_WRITE_THROUGH") == "1"
+            _store = PDFStore(REPORT_FOLDER, PDF_STORE_MEMORY_MAX_BYTES, PDF_STORE_DISK_MAX_BYTES, PDF_STORE_TTL,
+                              write_through=write_through)
+        return _store
@@ -1,7 +1,27 @@
+import threading
 import fitz
-import PyPDF2
-from typing import Any
-from config import logger
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from config import logger, PDF_PAGE_MIN_CHARS, PDF_PROBE_CACHE_SIZE
+from src.ocr import ocr_document
+from src.upload_store import file_digest
+
+# Probe results keyed by file content hash
+_page_map_cache: "OrderedDict[str, Dict[int, int]]" = OrderedDict()
+_extractable_cache: "OrderedDict[str, bool]" = OrderedDict()
+_probe_lock = threading.Lock()
+
+
+class OCRResult:
+    """Outcome of an OCR conversion; truthy when the searchable PDF was written."""
+
+    def __init__(self, ok: bool, failed_pages: int = 0) -> None:
+        self.ok = ok
+        # Pages kept without a text layer because their OCR failed
+        self.failed_pages = failed_pages
+
+    def __bool__(self) -> bool:
+        return self.ok
 
 
 def replace_text_in_pdf(pdf_path: str, output_path: str, old_text: str, new_text: str) -> None:
@@ -24,20 +44,67 @@ def replace_text_in_pdf(pdf_path: str, output_path: str, old_text: str, new_text
         logger.exception("Unexpected error: %s", e)
 
 
-def is_pdf_text_extractable(file_path: str, min_chars: int = 10) -> bool:
-    """Check if text can be extracted from the PDF."""
+def _sample_order(page_count: int) -> List[int]:
+    """First, last and middle pages first, then the rest in order."""
+    sampled = list(dict.fromkeys(i for i in (0, page_count - 1, page_count // 2) if 0 <= i < page_count))
+    return sampled + [i for i in range(page_count) if i not in sampled]
+
+
+def _remember(cache: "OrderedDict[str, Any]", key: str, value: Any) -> None:
+    with _probe_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > PDF_PROBE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def get_page_text_map(file_path: str, digest: Optional[str] = None) -> Dict[int, int]:
+    """
+    Return {page_index: number of extractable characters} for every page.
+
+    Pages below PDF_PAGE_MIN_CHARS are image-only and are the ones OCR has to
+    handle. The map is cached by file content hash; callers get their own copy.
+    """
+    digest = digest or file_digest(file_path)
+    with _probe_lock:
+        cached = _page_map_cache.get(digest)
+    if cached is not None:
+        return dict(cached)
+    with fitz.open(file_path) as doc:
+        page_map = {page.number: len(page.get_text().strip()) for page in doc}
+    _remember(_page_map_cache, digest, page_map)
+    return dict(page_map)
+
+
+def image_only_pages(file_path: str, digest: Optional[str] = None) -> List[int]:
+    """Indices of pages without a usable text layer."""
+    page_map = get_page_text_map(file_path, digest)
+    return [index for index, chars in sorted(page_map.items()) if chars < PDF_PAGE_MIN_CHARS]
+
+
+def is_pdf_text_extractable(file_path: str, min_chars: int = 10, digest: Optional[str] = None) -> bool:
+    """Check if text can be extracted from the PDF, stopping as soon as `min_chars` characters are found."""
     try:
-        with open(file_path, 'rb') as f:
-            reader: Any = PyPDF2.PdfReader(f)
-            extracted_text: str = ""
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    extracted_text += text
-            is_extractable = len(extracted_text.strip()) >= min_chars
-            logger.info("Text extractable from '%s': %s", file_path, is_extractable)
-            return is_extractable
-    except PyPDF2.PdfReaderError as e:
+        digest = digest or file_digest(file_path)
+        cache_key = f"{digest}:{min_chars}"
+        with _probe_lock:
+            page_map = _page_map_cache.get(digest)
+            cached = _extractable_cache.get(cache_key)
+        if page_map is not None:
+            return sum(page_map.values()) >= min_chars
+        if cached is not None:
+            return cached
+        found = 0
+        with fitz.open(file_path) as doc:
+            for index in _sample_order(doc.page_count):
+                found += len(doc[index].get_text().strip())
+                if found >= min_chars:
+                    break
+        is_extractable = found >= min_chars
+        _remember(_extractable_cache, cache_key, is_extractable)
+        logger.info("Text extractable from '%s': %s", file_path, is_extractable)
+        return is_extractable
+    except fitz.FileDataError as e:
         logger.exception("Error processing PDF for text extraction: %s", e)
         return False
     except Exception as e:
@@ -45,8 +112,24 @@ def is_pdf_text_extractable(file_path: str, min_chars: int = 10) -> bool:
         return False
 
     
-def image_to_pdf_with_ocr(output_pdf_path:str, input_filepath:str) -> bool:
-    pass
+def image_to_pdf_with_ocr(output_pdf_path:str, input_filepath:str) -> OCRResult:
+    """
+    Convert an image (or multi-page TIFF) to a searchable PDF.
+    The result is falsy on error and counts the pages OCR failed on otherwise.
+    """
+    try:
+        return OCRResult(True, ocr_document(input_filepath, output_pdf_path))
+    except Exception as e:
+        logger.exception("Error running OCR on image '%s': %s", input_filepath, e)
+        return OCRResult(False)
 
-def pdf_to_pdf_with_ocr(output_pdf_path:str, input_filepath:str) -> bool:
-    pass
\ No newline at end of file
+def pdf_to_pdf_with_ocr(output_pdf_path:str, input_filepath:str, pages: Optional[List[int]] = None) -> OCRResult:
+    """
+    Add an invisible OCR text layer to a scanned PDF, limited to `pages` when given.
+    The result is falsy on error and counts the pages OCR failed on otherwise.
+    """
+    try:
+        return OCRResult(True, ocr_document(input_filepath, output_pdf_path, pages=pages))
+    except Exception as e:
+        logger.exception("Error running OCR on PDF '%s': %s", input_filepath, e)
+        return OCRResult(False)
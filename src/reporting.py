@@ -1,8 +1,23 @@
-from config import DEFAULT_FONT_FAMILY, DEFAULT_HEADER_STYLE, DEFAULT_HEADER_SIZE, DEFAULT_SUBHEADER_STYLE, DEFAULT_SUBHEADER_SIZE, DEFAULT_BODY_STYLE, DEFAULT_BODY_SIZE, DEFAULT_FOOTER_STYLE, DEFAULT_FOOTER_SIZE, logger
+from config import DEFAULT_FONT_FAMILY, DEFAULT_HEADER_STYLE, DEFAULT_HEADER_SIZE, DEFAULT_SUBHEADER_STYLE, DEFAULT_SUBHEADER_SIZE, DEFAULT_BODY_STYLE, DEFAULT_BODY_SIZE, DEFAULT_FOOTER_STYLE, DEFAULT_FOOTER_SIZE, SIGNATURE_CACHE_SIZE, SIGNATURE_WIDTH_MM, SIGNATURE_DPI, logger
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from tzlocal import get_localzone
 from fpdf import FPDF
-from typing import Dict
+from fpdf.enums import Align, XPos, YPos
+try:
+    # Private to fpdf2 (pinned in requirements.txt); justified_text() falls back to multi_cell without it
+    from fpdf.line_break import TextLine
+except ImportError:
+    TextLine = None
+from PIL import Image
+from src.upload_store import file_digest
+from src.tracing import traced
+from typing import Dict, List, Optional, Tuple
+
+# Core PDF fonts that fpdf2 would otherwise substitute on every set_font call
+CORE_FONT_ALIASES: Dict[str, str] = {'arial': 'helvetica'}
 
 class ReportConfig:
     def __init__(self,
@@ -21,25 +36,160 @@ class ReportConfig:
         self.footer_style = footer_style
         self.footer_size = footer_size
 
+    def key(self) -> Tuple:
+        return tuple(sorted(self.__dict__.items()))
+
+
+class ReportTemplate:
+    """Layout constants and resolved fonts computed once per ReportConfig."""
+
+    def __init__(self, config: ReportConfig):
+        self.config = config
+        family = CORE_FONT_ALIASES.get(config.font_family.lower(), config.font_family)
+        self.header_font = (family, config.header_style, config.header_size)
+        self.subheader_font = (family, config.subheader_style, config.subheader_size)
+        self.body_font = (family, config.body_style, config.body_size)
+        self.footer_font = (family, config.footer_style, config.footer_size)
+        self.header_rule_y = 25
+        self.margin_x = 10
+        self.section_header_height = 10
+        self.body_line_height = 8
+        self.section_spacing = 5
+        self.signature_block_height = 30
+        self.signature_width = SIGNATURE_WIDTH_MM
+
+
+_templates: Dict[Tuple, ReportTemplate] = {}
+_templates_lock = threading.Lock()
+
+def get_report_template(config: ReportConfig) -> ReportTemplate:
+    """Return the cached template for a config, building it on first use."""
+    key = config.key()
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = ReportTemplate(config)
+        return template
+
+
+@lru_cache(maxsize=1)
+def get_local_timezone():
+    return get_localzone()
+
+
+_signatures: "OrderedDict[str, Image.Image]" = OrderedDict()
+_signatures_lock = threading.Lock()
+
+def load_signature_image(signature_image: str, digest: Optional[str] = None) -> Image.Image:
+    """
+    Return the decoded signature, downscaled to its printed size, from an LRU cache keyed by content hash.
+
+    Scanned signatures are often far larger than the 40 mm they are printed at,
+    so resizing once also keeps fpdf2 from compressing the full-size image into
+    every report.
+    """
+    digest = digest or file_digest(signature_image)
+    with _signatures_lock:
+        image = _signatures.get(digest)
+        if image is not None:
+            _signatures.move_to_end(digest)
+            return image
+    image = Image.open(signature_image)
+    image.load()
+    target_width = round(SIGNATURE_WIDTH_MM / 25.4 * SIGNATURE_DPI)
+    if image.width > target_width:
+        image = image.resize((target_width, max(1, round(image.height * target_width / image.width))),
+                             Image.LANCZOS)
+    with _signatures_lock:
+        _signatures[digest] = image
+        while len(_signatures) > SIGNATURE_CACHE_SIZE:
+            _signatures.popitem(last=False)
+    return image
+
 
 class ScientificPDF(FPDF):
-    def __init__(self, config: ReportConfig, title: str, *args, **kwargs):
+    def __init__(self, config: ReportConfig, title: str, *args, template: Optional[ReportTemplate] = None, **kwargs):
         super().__init__(*args, **kwargs)
         self.config = config
+        self.template = template or get_report_template(config)
         self.title_text = title
 
     def header(self) -> None:
-        self.set_font(self.config.font_family, self.config.header_style, self.config.header_size)
+        self.set_font(*self.template.header_font)
         self.cell(0, 10, self.title_text, ln=True, align='C')
         self.set_line_width(0.5)
-        self.line(10, 25, self.w - 10, 25)
+        self.line(self.template.margin_x, self.template.header_rule_y, self.w - self.template.margin_x,
+                  self.template.header_rule_y)
         self.ln(5)
 
     def footer(self) -> None:
         self.set_y(-15)
-        self.set_font(self.config.font_family, self.config.footer_style, self.config.footer_size)
+        self.set_font(*self.template.footer_font)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
+    def _wrap(self, text: str, max_width: float, char_widths: Dict[str, int]) -> List[Tuple[str, bool]]:
+        """Greedy word wrap in one pass. Returns (line, is_last_line_of_paragraph) pairs."""
+        scale = self.font_size_pt * 0.001 / self.k
+        space = char_widths[' '] * scale
+        lines = []
+        for paragraph in text.split('\n'):
+            line, line_width = [], 0.0
+            for word in paragraph.split():
+                word_width = sum(char_widths[c] for c in word) * scale
+                while word_width > max_width:
+                    # Split words wider than the column, like multi_cell does
+                    if line:
+                        lines.append((' '.join(line), False))
+                        line, line_width = [], 0.0
+                    cut, cut_width = 0, 0.0
+                    while cut < len(word) - 1 and cut_width + char_widths[word[cut]] * scale <= max_width:
+                        cut_width += char_widths[word[cut]] * scale
+                        cut += 1
+                    cut = max(cut, 1)
+                    lines.append((word[:cut], False))
+                    word = word[cut:]
+                    word_width = sum(char_widths[c] for c in word) * scale
+                needed = word_width + (space if line else 0)
+                if line and line_width + needed > max_width:
+                    lines.append((' '.join(line), False))
+                    line, line_width, needed = [], 0.0, word_width
+                line.append(word)
+                line_width += needed
+            lines.append((' '.join(line), True))
+        return lines
+
+    def justified_text(self, h: float, text: str) -> None:
+        """
+        Render full-width justified text, like multi_cell(0, h, text) for plain text.
+
+        multi_cell re-measures the growing line for every character it adds. Here the
+        core font's character widths are looked up once per character, and each
+        finished line goes through the same renderer that cell() and multi_cell() use.
+        Falls back to multi_cell for fonts or characters without a width table entry, for
+        text whose spacing the word wrap would change (runs of spaces, tabs, leading or
+        trailing blanks), and for fpdf2 versions without that renderer.
+        """
+        char_widths = getattr(self.current_font, 'cw', None)
+        text = self.normalize_text(text)
+        if (TextLine is None or not hasattr(self, '_render_styled_text_line')
+                or not hasattr(self, '_preload_font_styles')
+                or not isinstance(char_widths, dict) or ' ' not in char_widths
+                or any(c not in char_widths for c in set(text) - {'\n'})
+                or any(paragraph != ' '.join(paragraph.split()) for paragraph in text.split('\n'))):
+            self.multi_cell(0, h, text)
+            return
+        self.x = self.l_margin
+        width = self.w - self.r_margin - self.l_margin
+        for line, last in self._wrap(text, width - 2 * self.c_margin, char_widths):
+            if not line:
+                self.ln(h)
+                continue
+            self._render_styled_text_line(
+                TextLine(self._preload_font_styles(line, False), text_width=0, number_of_spaces=line.count(' '),
+                         align=Align.L if last else Align.J, height=h, max_width=width),
+                h, new_x=XPos.LMARGIN, new_y=YPos.NEXT,
+            )
+
 
 def add_signature_block(pdf: ScientificPDF, config: ReportConfig, date_str: str, signature_image: str = None,
                         signature_block_height: float = 30) -> None:
@@ -48,58 +198,65 @@ def add_signature_block(pdf: ScientificPDF, config: ReportConfig, date_str: str,
         pdf.add_page()
         target_y = pdf.h - pdf.b_margin - signature_block_height
     pdf.set_y(target_y)
-    pdf.set_font(config.font_family, config.body_style, config.body_size)
+    pdf.set_font(*pdf.template.body_font)
     pdf.cell(60, 10, 'Authorized Signature:', ln=0)
     current_x = pdf.get_x() - 20
     current_y = pdf.get_y()
     if signature_image:
-        pdf.image(signature_image, x=current_x, y=current_y, w=40)
+        pdf.image(load_signature_image(signature_image), x=current_x, y=current_y, w=pdf.template.signature_width)
     pdf.ln(15)
     pdf.cell(0, 10, f'Creation date: {date_str}', ln=True)
 
 
-def create_scientific_report(filename: str,
+@traced("render_pdf")
+def create_scientific_report(filename: Optional[str],
                              config: ReportConfig,
                              content: Dict[str, str],
                              title: str = "Scientific Report",
                              date_str: str = None,
-                             signature_image: str = None) -> None:
-    pdf = ScientificPDF(config, title)
+                             signature_image: str = None) -> bytes:
+    """Render the report in memory, write it to `filename` if given, and return the PDF bytes."""
+    template = get_report_template(config)
+    pdf = ScientificPDF(config, title, template=template)
     pdf.add_page()
 
     def add_section(header: str, text: str) -> None:
-        pdf.set_font(config.font_family, config.subheader_style, config.subheader_size)
-        pdf.cell(0, 10, header, ln=True)
-        pdf.set_font(config.font_family, config.body_style, config.body_size)
-        pdf.multi_cell(0, 8, text)
-        pdf.ln(5)
+        pdf.set_font(*template.subheader_font)
+        pdf.cell(0, template.section_header_height, header, ln=True)
+        pdf.set_font(*template.body_font)
+        pdf.justified_text(template.body_line_height, text)
+        pdf.ln(template.section_spacing)
 
     for section, section_text in content.items():
         add_section(section, section_text)
 
     if date_str is None:
-        local_tz = get_localzone()
-        current_time = datetime.now(local_tz)
+        current_time = datetime.now(get_local_timezone())
         date_str = current_time.strftime('%Y-%m-%d %H:%M:%S %Z')
 
 
-    add_signature_block(pdf, config, date_str, signature_image)
-    pdf.output(filename)
-    logger.info("Scientific report generated and saved as '%s'", filename)
+    add_signature_block(pdf, config, date_str, signature_image, template.signature_block_height)
+    pdf_bytes = bytes(pdf.output())
+    if filename:
+        with open(filename, 'wb') as f:
+            f.write(pdf_bytes)
+        logger.info("Scientific report generated and saved as '%s'", filename)
+    return pdf_bytes
+
+
+def render_report_bytes(content: Dict[str, str], title: str, signature_image: Optional[str]) -> bytes:
+    """Render a report with the default config straight to PDF bytes."""
+    return create_scientific_report(filename=None, config=ReportConfig(), content=content, title=title,
+                                    signature_image=signature_image)
 
 
 def generate_report_from_dict(content: Dict[str, str], filename: str, title: str, signature_image: str) -> bool:
-    """Generate a PDF report from a dictionary of content."""
+    """Generate a PDF report from a dictionary of content and save it to `filename`."""
     try:
-        config = ReportConfig()
-        create_scientific_report(
-            filename=filename,
-            config=config,
-            content=content,
-            title=title,
-            signature_image=signature_image
-        )
+        pdf_bytes = render_report_bytes(content, title, signature_image)
+        with open(filename, 'wb') as f:
+            f.write(pdf_bytes)
         return True
     except Exception as e:
         logger.exception("Error generating report from dictionary: %s", e)
-        return False
\ No newline at end of file
+        return False
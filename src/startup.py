@@ -0,0 +1,121 @@
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Iterable, List, Tuple
+from config import logger
+
+# app.py imports only Flask and the light bookkeeping modules. These pull in LangChain, fpdf2,
+# PyMuPDF, ffmpeg and NumPy, and are imported on first use or ahead of time by warm_imports().
+HEAVY_MODULES: Tuple[str, ...] = (
+    "src.document_processor",
+    "src.pdf_utils",
+    "src.document_ingest",
+    "src.audio_utils",
+    "src.batch",
+)
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def warm_imports(modules: Iterable[str] = HEAVY_MODULES) -> float:
+    """Import the heavy pipeline modules now. Returns the time it took in seconds."""
+    start = time.perf_counter()
+    for module in modules:
+        __import__(module)
+    elapsed = time.perf_counter() - start
+    logger.info("Imported the report and audio pipelines in %.2fs", elapsed)
+    return elapsed
+
+
+def start_import_warmup() -> threading.Thread:
+    """
+    Run warm_imports() in a daemon thread so the first request does not pay for it.
+
+    Do not call this in a process that forks afterwards: a thread holding an
+    import lock at fork time would deadlock the child.
+    """
+    thread = threading.Thread(target=warm_imports, name="import-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse `python -X importtime` output into (module, self_us, cumulative_us, depth) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def measure_imports(code: str) -> List[Tuple[str, int, int, int]]:
+    """Run `code` in a fresh interpreter under -X importtime and return the parsed rows."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiling run failed: {result.stderr.strip()[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def _print_import_table(title: str, rows: List[Tuple[str, int, int, int]], skip: set, top: int) -> None:
+    """Print the most expensive imports and their direct dependencies, slowest first."""
+    rows = [row for row in rows if row[0] not in skip]
+    total_us = sum(row[2] for row in rows if row[3] == 0)
+    print(f"\n{title}: {total_us / 1e6:.2f}s in {len(rows)} modules")
+    shown = sorted((row for row in rows if row[3] <= 1), key=lambda row: row[2], reverse=True)[:top]
+    for module, _, cumulative_us, depth in shown:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {'  ' * depth}{module}")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=5) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def measure_time_to_first_request(timeout: float = 120.0) -> Tuple[float, float]:
+    """
+    Start the development server in a subprocess and poll /healthz until it answers.
+
+    Returns (seconds from process start to the first successful response, latency of that response).
+    """
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", f"import app; app.run_dev_server(port={port}, open_browser=False)"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                latency = _get(f"http://127.0.0.1:{port}/healthz")
+                return time.perf_counter() - start, latency
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Server did not answer within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def profile_startup(top: int = 15) -> None:
+    """Print per-module import cost at startup and on first use, then the time to the first served request."""
+    startup_rows = measure_imports("import app")
+    _print_import_table("Imported at startup (import app)", startup_rows, set(), top)
+    lazy_rows = measure_imports("import app, src.startup; src.startup.warm_imports()")
+    already_loaded = {row[0] for row in startup_rows}
+    _print_import_table("Imported on first use of the pipelines", lazy_rows, already_loaded, top)
+    ready_s, latency_s = measure_time_to_first_request()
+    print(f"\nTime to first request: {ready_s:.2f}s (first /healthz answered in {latency_s * 1000:.1f} ms)")
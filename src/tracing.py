@@ -0,0 +1,217 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config import (logger, PROFILE_SLOW_REQUESTS, PROFILE_THRESHOLD_SECONDS, PROFILE_SAMPLE_INTERVAL,
+                    PROFILE_FOLDER)
+from src.metrics import STAGE_SECONDS
+
+# Correlation id of the request being handled; copied into every log record by RequestIdFilter
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+_trace_var: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+# Client-supplied ids end up in log lines and profile file names, so anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+logger.addFilter(RequestIdFilter())
+
+
+class Trace:
+    """Stage timings, and stack samples when profiling, of one request."""
+
+    def __init__(self, request_id: str, name: str) -> None:
+        self.request_id = request_id
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.samples: Counter = Counter()
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((stage, seconds))
+
+    def summary(self) -> str:
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, seconds in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        return " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in totals.items())
+
+
+class SlowRequestProfiler:
+    """
+    Samples the stacks of threads working on a traced request.
+
+    Samples are kept per trace as folded stacks ("frame;frame;frame count", the
+    input format of flamegraph.pl and speedscope) and only written to `folder`
+    for requests slower than `threshold` seconds.
+    """
+
+    def __init__(self, folder: str, threshold: float, interval: float) -> None:
+        self.folder = folder
+        self.threshold = threshold
+        self.interval = interval
+        self._threads: Dict[int, Trace] = {}
+        self._lock = threading.Lock()
+        self._sampler_pid: Optional[int] = None
+
+    def _ensure_sampler(self) -> None:
+        # Started lazily in the process that traces requests, like the job workers
+        if self._sampler_pid != os.getpid():
+            self._sampler_pid = os.getpid()
+            threading.Thread(target=self._run, name="request-profiler", daemon=True).start()
+
+    def attach(self, trace: Trace) -> Optional[Trace]:
+        """Attribute the current thread's samples to `trace`. Returns the trace it replaced."""
+        with self._lock:
+            self._ensure_sampler()
+            ident = threading.get_ident()
+            previous = self._threads.get(ident)
+            self._threads[ident] = trace
+            return previous
+
+    def detach(self, previous: Optional[Trace] = None) -> None:
+        with self._lock:
+            ident = threading.get_ident()
+            if previous is None or previous.finished:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] = previous
+
+    def forget(self, trace: Trace) -> None:
+        with self._lock:
+            for ident in [ident for ident, owner in self._threads.items() if owner is trace]:
+                del self._threads[ident]
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident, trace in threads.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    trace.samples[_fold(frame)] += 1
+
+    def dump(self, trace: Trace, seconds: float) -> Optional[str]:
+        if seconds < self.threshold or not trace.samples:
+            return None
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, f"{time.strftime('%Y%m%d-%H%M%S')}_{trace.request_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in trace.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _fold(frame: Any) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_profiler = SlowRequestProfiler(PROFILE_FOLDER, PROFILE_THRESHOLD_SECONDS, PROFILE_SAMPLE_INTERVAL) \
+    if PROFILE_SLOW_REQUESTS else None
+
+
+def start_trace(name: str, request_id: Optional[str] = None) -> Trace:
+    """
+    Begin tracing a request in the current context and make its id the log correlation id.
+
+    `request_id` (e.g. the X-Request-ID header) is only used if it matches REQUEST_ID_PATTERN.
+    """
+    if not request_id or not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    trace = Trace(request_id, name)
+    request_id_var.set(trace.request_id)
+    _trace_var.set(trace)
+    if _profiler:
+        _profiler.attach(trace)
+    return trace
+
+
+def finish_trace(trace: Trace, quiet: bool = False) -> float:
+    """
+    Log the request's stage breakdown and dump its profile if it was slow. Returns its duration.
+
+    Also clears the current context's trace, since server threads are reused for the next request.
+    """
+    seconds = time.perf_counter() - trace.started
+    trace.finished = True
+    profile_path = None
+    if _profiler:
+        _profiler.forget(trace)
+        profile_path = _profiler.dump(trace, seconds)
+    if not quiet:
+        logger.info("%s finished in %.3fs %s", trace.name, seconds, trace.summary())
+    if profile_path:
+        logger.warning("Slow request profile written to %s", profile_path)
+    if _trace_var.get() is trace:
+        request_id_var.set("-")
+        _trace_var.set(None)
+    return seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage: observed in the stage histogram and added to the current request's trace."""
+    trace = _trace_var.get()
+    previous = _profiler.attach(trace) if _profiler and trace else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if trace:
+            trace.add_span(name, seconds)
+        if _profiler and trace:
+            _profiler.detach(previous)
+        logger.debug("Stage %s took %.3fs", name, seconds)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of stage(). For generator functions the stage lasts until the generator is exhausted."""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with stage(name):
+                    return (yield from fn(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args: Any) -> Future:
+    """executor.submit() that runs `fn` with the caller's correlation id and trace."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Optional
+from werkzeug.utils import secure_filename
+from config import logger, UPLOAD_BLOB_FOLDER, UPLOAD_CHUNK_SIZE, UPLOAD_BLOB_MIN_AGE, UPLOAD_GC_INTERVAL
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def stream_digest(stream: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Return the SHA-256 hex digest of a seekable stream read in chunks, then rewind it."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class StoredUpload:
+    def __init__(self, digest: str, path: str, size: int, deduplicated: bool) -> None:
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.deduplicated = deduplicated
+
+
+class UploadStore:
+    """
+    Content-addressed store of uploaded files.
+
+    An upload is hashed while it is copied to disk in fixed-size chunks and
+    stored as <digest><ext>, sharded by the first two hex characters, so
+    identical uploads share one blob and the digest can key downstream caches.
+    Files derived from a blob (e.g. its OCR'd copy) live next to it as
+    <digest><suffix> and are collected with it. Requests hold a reference while
+    they use a blob; unreferenced blobs not used for `min_age` seconds are
+    garbage-collected. Reference counts are per process, so the age limit is
+    what protects blobs used by other workers.
+    """
+
+    def __init__(self, folder: str, chunk_size: int = UPLOAD_CHUNK_SIZE, min_age: float = UPLOAD_BLOB_MIN_AGE,
+                 gc_interval: float = UPLOAD_GC_INTERVAL) -> None:
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.min_age = min_age
+        self.gc_interval = gc_interval
+        self.deduplicated = 0
+        self._refs: Counter = Counter()
+        self._last_gc = time.time()
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, suffix: str = "") -> str:
+        return os.path.join(self.folder, digest[:2], digest + suffix)
+
+    def derived_path(self, digest: str, suffix: str) -> str:
+        """Path for a file derived from the blob `digest`, removed together with it."""
+        return self._path(digest, suffix)
+
+    def digest_of(self, path: str) -> Optional[str]:
+        """Return the digest of a blob in this store from its path, or None for any other file."""
+        stem, _ = os.path.splitext(os.path.basename(path))
+        if _DIGEST_RE.match(stem) and os.path.dirname(os.path.abspath(path)) == os.path.join(self.folder, stem[:2]):
+            return stem
+        return None
+
+    def save(self, stream: BinaryIO, filename: str) -> StoredUpload:
+        """Copy an upload into the store and take a reference to it. Call release() when done."""
+        _, ext = os.path.splitext(secure_filename(filename))
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = os.path.join(self.folder, f"upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            path = self._path(digest, ext.lower())
+            with self._lock:
+                self._refs[digest] += 1
+                deduplicated = os.path.exists(path)
+                if deduplicated:
+                    # Touch it so the age-based collection sees it as recently used
+                    os.utime(path)
+                    self.deduplicated += 1
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info("Upload %s stored as %s (%d bytes%s)", filename, digest[:12], size,
+                    ", deduplicated" if deduplicated else "")
+        self.maybe_gc()
+        return StoredUpload(digest, path, size, deduplicated)
+
+    def release(self, *digests: Optional[str]) -> None:
+        with self._lock:
+            for digest in digests:
+                if digest and self._refs[digest] > 0:
+                    self._refs[digest] -= 1
+                    if not self._refs[digest]:
+                        del self._refs[digest]
+
+    def maybe_gc(self) -> None:
+        if time.time() - self._last_gc >= self.gc_interval:
+            self.gc()
+
+    def gc(self) -> int:
+        """Remove unreferenced blobs (and their derived files) not used for `min_age` seconds. Returns the count."""
+        with self._lock:
+            self._last_gc = time.time()
+            cutoff = self._last_gc - self.min_age
+            groups: Dict[str, list] = {}
+            if os.path.isdir(self.folder):
+                for shard in os.listdir(self.folder):
+                    shard_path = os.path.join(self.folder, shard)
+                    if not os.path.isdir(shard_path):
+                        continue
+                    for name in os.listdir(shard_path):
+                        if _DIGEST_RE.match(name[:64]):
+                            groups.setdefault(name[:64], []).append(os.path.join(shard_path, name))
+            removed = 0
+            for digest, paths in groups.items():
+                if self._refs[digest]:
+                    continue
+                try:
+                    if max(os.stat(path).st_mtime for path in paths) >= cutoff:
+                        continue
+                    for path in paths:
+                        os.remove(path)
+                except FileNotFoundError:
+                    # Collected concurrently by another process
+                    continue
+                removed += 1
+            if removed:
+                logger.info("Garbage-collected %d unreferenced uploads", removed)
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"referenced": len(self._refs), "deduplicated": self.deduplicated}
+
+
+_store: Optional[UploadStore] = None
+_store_lock = threading.Lock()
+
+def get_upload_store() -> UploadStore:
+    """Return the process-wide upload store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UploadStore(UPLOAD_BLOB_FOLDER)
+        return _store
+
+
+def file_digest(file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Return the SHA-256 hex digest of a file's content. Blobs of the upload store are not re-read."""
+    digest = get_upload_store().digest_of(file_path)
+    if digest:
+        return digest
+    with open(file_path, 'rb') as f:
+        return stream_digest(f, chunk_size)
@@ -0,0 +1,181 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+from config import (logger, LOW_MODEL, HIGH_MODEL, WHISPER_POOL_SIZE, WHISPER_LATENCY_SLO_SECONDS,
+                    WHISPER_SPECULATIVE, WHISPER_REFINE_MAX_SECONDS, WHISPER_RTF_PRIORS, WHISPER_RTF_EWMA_ALPHA)
+from src.metrics import WHISPER_DECISIONS, WHISPER_REAL_TIME_FACTOR
+
+# /upload option values: 1 and 2 pick LOW_MODEL and HIGH_MODEL, AUTO_OPTION lets the scheduler choose
+AUTO_OPTION = 0
+MODEL_OPTIONS: Dict[str, int] = {LOW_MODEL: 1, HIGH_MODEL: 2}
+
+
+class ModelDecision:
+    """
+    The scheduler's choice for one recording.
+
+    `mode` is "direct" (the model meets the SLO), "speculative" (LOW_MODEL now,
+    HIGH_MODEL refinement in the background), "cached" (a transcript already
+    exists) or "best_effort" (no model meets the SLO, so the fastest is used).
+    """
+
+    def __init__(self, model_name: str, mode: str, duration: float, backlog_seconds: float,
+                 estimates: Dict[str, float]) -> None:
+        self.model_name = model_name
+        self.mode = mode
+        self.duration = duration
+        self.backlog_seconds = backlog_seconds
+        self.estimates = estimates
+
+    @property
+    def option(self) -> int:
+        return MODEL_OPTIONS[self.model_name]
+
+    @property
+    def refine(self) -> bool:
+        return self.mode == "speculative"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "mode": self.mode,
+            "duration_seconds": round(self.duration, 2),
+            "estimated_seconds": {name: round(seconds, 2) for name, seconds in self.estimates.items()},
+        }
+
+
+class WhisperScheduler:
+    """
+    Picks the Whisper model for a recording from its duration, the current load and a latency SLO.
+
+    The load is the estimated work of running transcriptions plus that
+    reserved for queued ones, shared by WHISPER_POOL_SIZE instances. Each
+    model's real-time factor is an EWMA of measured transcriptions, so the
+    estimates follow the actual hardware and its contention. Per process, like
+    the model registry.
+    """
+
+    def __init__(self, slo_seconds: float = WHISPER_LATENCY_SLO_SECONDS, speculative: bool = WHISPER_SPECULATIVE,
+                 refine_max_seconds: float = WHISPER_REFINE_MAX_SECONDS, slots: int = WHISPER_POOL_SIZE,
+                 rtf_priors: Dict[str, float] = WHISPER_RTF_PRIORS, alpha: float = WHISPER_RTF_EWMA_ALPHA) -> None:
+        self.slo_seconds = slo_seconds
+        self.speculative = speculative
+        self.refine_max_seconds = refine_max_seconds
+        self.slots = max(1, slots)
+        self.alpha = alpha
+        self._rtf: Dict[str, float] = dict(rtf_priors)
+        self._samples: Dict[str, int] = {name: 0 for name in rtf_priors}
+        # Estimated seconds of work per running or reserved transcription
+        self._work: Dict[int, float] = {}
+        self._next_ticket = 0
+        self._lock = threading.Lock()
+        WHISPER_REAL_TIME_FACTOR.set_function(lambda: {(name,): rtf for name, rtf in self.real_time_factors().items()})
+
+    def real_time_factors(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._rtf)
+
+    def backlog_seconds(self) -> float:
+        with self._lock:
+            return sum(self._work.values())
+
+    def estimate(self, model_name: str, duration: float, backlog_seconds: Optional[float] = None) -> float:
+        """Estimated seconds until a transcription of `duration` seconds submitted now would finish."""
+        if backlog_seconds is None:
+            backlog_seconds = self.backlog_seconds()
+        with self._lock:
+            rtf = self._rtf.get(model_name, max(self._rtf.values()))
+        return backlog_seconds / self.slots + rtf * duration
+
+    def choose(self, duration: float, cached_models: Iterable[str] = (), speculative: Optional[bool] = None
+               ) -> ModelDecision:
+        """Pick the most accurate model that meets the SLO; see ModelDecision for the modes."""
+        speculative = self.speculative if speculative is None else speculative
+        cached_models = set(cached_models)
+        backlog = self.backlog_seconds()
+        estimates = {name: 0.0 if name in cached_models else self.estimate(name, duration, backlog)
+                     for name in (LOW_MODEL, HIGH_MODEL)}
+        if HIGH_MODEL in cached_models:
+            decision = ModelDecision(HIGH_MODEL, "cached", duration, backlog, estimates)
+        elif estimates[HIGH_MODEL] <= self.slo_seconds:
+            decision = ModelDecision(HIGH_MODEL, "direct", duration, backlog, estimates)
+        elif estimates[LOW_MODEL] <= self.slo_seconds:
+            # The refinement also waits for this request's own LOW_MODEL run
+            low_work = estimates[LOW_MODEL] - backlog / self.slots
+            refine_estimate = self.estimate(HIGH_MODEL, duration, backlog + low_work)
+            mode = "speculative" if speculative and refine_estimate <= self.refine_max_seconds else "direct"
+            decision = ModelDecision(LOW_MODEL, "cached" if LOW_MODEL in cached_models else mode, duration, backlog,
+                                     estimates)
+        else:
+            decision = ModelDecision(LOW_MODEL, "best_effort", duration, backlog, estimates)
+        WHISPER_DECISIONS.inc(model=decision.model_name, mode=decision.mode)
+        logger.info("Whisper scheduler: %.1fs of audio, backlog %.1fs, estimates %s=%.1fs %s=%.1fs, "
+                    "SLO %.1fs -> %s (%s)", duration, backlog, LOW_MODEL, estimates[LOW_MODEL], HIGH_MODEL, estimates[HIGH_MODEL],
+                    self.slo_seconds, decision.model_name, decision.mode)
+        return decision
+
+    def reserve(self, model_name: str, duration: float) -> int:
+        """Count a queued transcription in the backlog until release(). Returns its ticket."""
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            rtf = self._rtf.get(model_name, max(self._rtf.values()))
+            self._work[ticket] = rtf * duration
+            return ticket
+
+    def release(self, ticket: int) -> None:
+        """Drop a reservation. Safe to call more than once."""
+        with self._lock:
+            self._work.pop(ticket, None)
+
+    def observe(self, model_name: str, duration: float, elapsed: float) -> None:
+        """Fold a measured transcription into the model's real-time factor."""
+        if duration <= 0:
+            return
+        rtf = elapsed / duration
+        with self._lock:
+            previous = self._rtf.get(model_name, rtf)
+            self._rtf[model_name] = previous + self.alpha * (rtf - previous)
+            self._samples[model_name] = self._samples.get(model_name, 0) + 1
+            smoothed = self._rtf[model_name]
+        logger.info("Whisper %s transcribed %.1fs of audio in %.1fs (RTF %.3f, smoothed %.3f)",
+                    model_name, duration, elapsed, rtf, smoothed)
+
+    @contextmanager
+    def running(self, model_name: str, duration: Optional[float]) -> Iterator[None]:
+        """Count a transcription in the backlog while it runs and measure it if it completes."""
+        if duration is None:
+            yield
+            return
+        ticket = self.reserve(model_name, duration)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(ticket)
+        self.observe(model_name, duration, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "slo_seconds": self.slo_seconds,
+                "speculative": self.speculative,
+                "backlog_seconds": round(sum(self._work.values()), 2),
+                "running_or_queued": len(self._work),
+                "real_time_factor": {name: round(rtf, 4) for name, rtf in self._rtf.items()},
+                "samples": dict(self._samples),
+            }
+
+
+_scheduler: Optional[WhisperScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_whisper_scheduler() -> WhisperScheduler:
+    """Return the process-wide Whisper scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = WhisperScheduler()
+        return _scheduler
@@ -74,6 +74,38 @@ function updateAttachedFileUI() {
     }
 }
 
+/* ====================================================
+   Live Report Preview
+======================================================= */
+function resetReportPreview() {
+    let preview = document.getElementById('report-preview');
+    if (!preview) {
+        preview = document.createElement('div');
+        preview.id = 'report-preview';
+        preview.classList.add('report-preview');
+        document.getElementById('container').appendChild(preview);
+    }
+    preview.innerHTML = '<h3></h3>';
+    return preview;
+}
+
+function addPreviewSection(preview, section) {
+    const sectionElem = document.createElement('div');
+    sectionElem.classList.add('report-section');
+    sectionElem.dataset.index = section.index;
+    const heading = document.createElement('h4');
+    heading.textContent = section.key;
+    const body = document.createElement('p');
+    body.textContent = section.text;
+    sectionElem.appendChild(heading);
+    sectionElem.appendChild(body);
+
+    // Sections can finish out of order, keep them sorted by their index
+    const next = Array.from(preview.querySelectorAll('.report-section'))
+        .find(elem => Number(elem.dataset.index) > section.index);
+    preview.insertBefore(sectionElem, next || null);
+}
+
 function showFileTypeSelectionPopup() {
     // Create overlay div and use a CSS class instead of inline styles
     const overlay = document.createElement('div');
@@ -331,17 +363,30 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Only send if there's any content
         if (message || attachedDocument || attachedSignature) {
-            fetch('/submit', {
+            // Sections are rendered as they are generated; the PDF link arrives last
+            const preview = resetReportPreview();
+            fetch('/submit/stream', {
                 method: 'POST',
                 body: formData
             })
-                .then(response => response.json())
-                .then(data => {
-                    console.log('Server responded with:', data);
-                    if (data.download_url) {
-                        // Automatically open the URL in a new tab
-                        window.open(data.download_url, '_blank');
+                .then(async response => {
+                    if (!response.ok) {
+                        const data = await response.json();
+                        throw new Error(data.error || 'Error submitting report');
                     }
+                    await readNdjson(response, data => {
+                        console.log('Server sent:', data);
+                        if (data.type === 'title') {
+                            preview.querySelector('h3').textContent = data.title;
+                        } else if (data.type === 'section') {
+                            addPreviewSection(preview, data);
+                        } else if (data.type === 'done') {
+                            // Automatically open the URL in a new tab
+                            window.open(data.download_url, '_blank');
+                        } else if (data.type === 'error') {
+                            console.error(data.error);
+                        }
+                    });
                     // Hide notification after receiving response
                     notification.style.display = 'none';
                 })
@@ -367,54 +412,230 @@ document.addEventListener('DOMContentLoaded', () => {
 let mediaRecorder;
 let audioChunks = [];
 
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+// Read a newline-delimited JSON response body, calling onMessage for each parsed line
+async function readNdjson(response, onMessage) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onMessage(JSON.parse(line)));
+    }
+    if (buffered.trim()) {
+        onMessage(JSON.parse(buffered));
+    }
+}
+
+// Poll a background job until it has finished. Returns its status, or null after timeoutMs
+async function pollJob(statusUrl, intervalMs = JOB_POLL_INTERVAL_MS, timeoutMs = JOB_POLL_TIMEOUT_MS) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        try {
+            const response = await fetch(statusUrl);
+            if (response.ok) {
+                const job = await response.json();
+                if (['succeeded', 'failed', 'cancelled'].includes(job.status)) return job;
+            }
+        } catch (error) {
+            console.error('Error polling job:', error);
+        }
+    }
+    return null;
+}
+
+// Upload the whole recording at once; used when live transcription is unavailable
+async function uploadRecording() {
+    const notification = document.getElementById('processing-notification');
+    const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
+    const formData = new FormData();
+    // Append the recording file with a descriptive filename
+    formData.append('audio', audioBlob, 'recording.wav');
+
+    // Read the selected option from the dropdown and include it in the request.
+    const selectedOption = document.getElementById('recording-option').value;
+    formData.append('option', selectedOption);
+
+    try {
+        const response = await fetch('/upload/stream', {
+            method: 'POST',
+            body: formData
+        });
+
+        if (response.ok) {
+            // Segments arrive as newline-delimited JSON while transcription is still running
+            const chatInputElem = document.getElementById('chatInput');
+            let insertedText = '';
+            let refiningUrl = null;
+            await readNdjson(response, data => {
+                if (data.segment) {
+                    chatInputElem.value += data.segment.text;
+                    insertedText += data.segment.text;
+                    chatInputElem.dispatchEvent(new Event('input'));
+                } else if (data.transcript !== undefined) {
+                    if (notification) {
+                        notification.style.display = 'none';
+                    }
+                } else if (data.refining) {
+                    // In speculative mode the accurate transcript is produced by a background job
+                    refiningUrl = data.refining.status_url;
+                } else if (data.error) {
+                    console.error(data.error);
+                }
+            });
+            if (refiningUrl) {
+                const job = await pollJob(refiningUrl);
+                if (job && job.status === 'succeeded') {
+                    // Swap the fast transcript for the accurate one, unless it has been edited meanwhile
+                    const refinedText = job.result.segments.map(segment => segment.text).join('');
+                    const at = chatInputElem.value.lastIndexOf(insertedText);
+                    if (insertedText && at !== -1) {
+                        chatInputElem.value = chatInputElem.value.slice(0, at) + refinedText +
+                            chatInputElem.value.slice(at + insertedText.length);
+                        chatInputElem.dispatchEvent(new Event('input'));
+                    }
+                } else if (job) {
+                    console.error(job.error || `Transcript refinement ${job.status}`);
+                }
+            }
+        } else {
+            const data = await response.json();
+            console.error(data.error || 'Error processing file');
+        }
+
+        // Hide the notification immediately after processing the response
+        if (notification) {
+            notification.style.display = 'none';
+        }
+    } catch (error) {
+        console.error('Error uploading audio:', error);
+    }
+}
+
+// Live transcription: while recording, a chunk is sent every LIVE_TIMESLICE_MS and the server
+// transcribes finished stretches of speech, so the transcript is ready right after stopping.
+const LIVE_TIMESLICE_MS = 1000;
+let liveSession = null;
+let liveQueue = Promise.resolve();
+let liveSegmentCount = 0;
+let liveText = '';
+
+function appendLiveSegments(segments) {
+    const chatInputElem = document.getElementById('chatInput');
+    segments.forEach(segment => {
+        chatInputElem.value += segment.text;
+        liveText += segment.text;
+    });
+    liveSegmentCount += segments.length;
+    if (segments.length) {
+        chatInputElem.dispatchEvent(new Event('input'));
+    }
+}
+
+// Remove the live transcript from the input before falling back to a full upload
+function discardLiveText() {
+    const chatInputElem = document.getElementById('chatInput');
+    const at = chatInputElem.value.lastIndexOf(liveText);
+    if (liveText && at !== -1) {
+        chatInputElem.value = chatInputElem.value.slice(0, at) + chatInputElem.value.slice(at + liveText.length);
+        chatInputElem.dispatchEvent(new Event('input'));
+    }
+    liveText = '';
+}
+
+async function startLiveSession(option) {
+    liveSegmentCount = 0;
+    liveText = '';
+    liveQueue = Promise.resolve();
+    try {
+        const formData = new FormData();
+        formData.append('option', option);
+        const response = await fetch('/record/start', { method: 'POST', body: formData });
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        console.error('Could not start live transcription:', error);
+        return null;
+    }
+}
+
+// Frees the session's decoder at once instead of after the server's idle timeout
+function cancelLiveSession(session) {
+    fetch(session.cancel_url, { method: 'DELETE' }).catch(() => {});
+}
+
+// Chunks must reach the server in order, so each one waits for the previous upload
+function sendLiveChunk(blob) {
+    liveQueue = liveQueue.then(async () => {
+        if (!liveSession) return;
+        try {
+            const response = await fetch(`${liveSession.chunk_url}?since=${liveSegmentCount}`, {
+                method: 'POST',
+                body: blob
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || response.statusText);
+            appendLiveSegments(data.segments);
+        } catch (error) {
+            console.error('Live transcription failed, the recording will be uploaded when it stops:', error);
+            cancelLiveSession(liveSession);
+            liveSession = null;
+        }
+    });
+}
+
+// Returns true when the live session produced the final transcript
+async function finishLiveSession() {
+    await liveQueue;
+    const session = liveSession;
+    liveSession = null;
+    if (!session) return false;
+    try {
+        const response = await fetch(session.stop_url, { method: 'POST' });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || response.statusText);
+        appendLiveSegments(data.segments.slice(liveSegmentCount));
+        return true;
+    } catch (error) {
+        console.error('Live transcription failed, uploading the recording instead:', error);
+        cancelLiveSession(session);
+        return false;
+    }
+}
+
 document.getElementById('play-btn').addEventListener('click', async () => {
     try {
         const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
         mediaRecorder = new MediaRecorder(stream);
-        mediaRecorder.start();
         audioChunks = [];
+        liveSession = await startLiveSession(document.getElementById('recording-option').value);
 
         mediaRecorder.addEventListener("dataavailable", event => {
             if (event.data.size > 0) {
                 audioChunks.push(event.data);
+                sendLiveChunk(event.data);
             }
         });
 
         mediaRecorder.addEventListener("stop", async () => {
-            const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-            const formData = new FormData();
-            // Append the recording file with a descriptive filename
-            formData.append('audio', audioBlob, 'recording.wav');
-
-            // Read the selected option from the dropdown and include it in the request.
-            const selectedOption = document.getElementById('recording-option').value;
-            formData.append('option', selectedOption);
-
-            try {
-                const response = await fetch('/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-                const data = await response.json();
+            if (await finishLiveSession()) {
                 const notification = document.getElementById('processing-notification');
-
-                if (response.ok) {
-                    const chatInputElem = document.getElementById('chatInput');
-                    chatInputElem.value += data.transcript;
-                    chatInputElem.dispatchEvent(new Event('input'));
-                } else {
-                    console.error(data.error || 'Error processing file');
-                }
-
-                // Hide the notification immediately after processing the response
                 if (notification) {
                     notification.style.display = 'none';
                 }
-            } catch (error) {
-                console.error('Error uploading audio:', error);
+                return;
             }
+            discardLiveText();
+            await uploadRecording();
         });
 
+        mediaRecorder.start(LIVE_TIMESLICE_MS);
         document.getElementById('play-btn').disabled = true;
         document.getElementById('stop-btn').disabled = false;
     } catch (err) {
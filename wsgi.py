@@ -0,0 +1,26 @@
+"""
+WSGI entry point for production, loaded by gunicorn in the master process:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app, everything done at import time here happens once before the
+workers are forked, so the Whisper weights are shared copy-on-write.
+"""
+import gc
+from config import LOW_MODEL, HIGH_MODEL, WHISPER_PRELOAD, SERVER_WARM_OLLAMA
+from app import app
+from src.agent import warm_ollama
+from src.model_registry import get_model_registry
+from src.startup import warm_imports
+
+# app.py imports the pipelines lazily; import them here so the workers share them too
+warm_imports()
+if not WHISPER_PRELOAD:
+    # app.py already preloads them when WHISPER_PRELOAD is set
+    get_model_registry().preload([LOW_MODEL, HIGH_MODEL])
+if SERVER_WARM_OLLAMA:
+    warm_ollama()
+
+# Move everything allocated so far out of the garbage collector's reach, so collections
+# in the workers do not write to (and un-share) pages inherited from the master
+gc.freeze()